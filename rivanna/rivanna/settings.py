@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,8 +42,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'rivannabank.logs.CorrelationIdMiddleware',
+    'rivannabank.instrumentation.SQLInstrumentationMiddleware',
+    'rivannabank.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'rivannabank.context.CustomerContextMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -52,6 +57,11 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'rivanna.urls'
 
+# Per-request SQL instrumentation (rivannabank.instrumentation): send query
+# count/DB time response headers, and how many of the slowest statements to log.
+SQL_INSTRUMENTATION_HEADERS = DEBUG
+SQL_SLOWEST_STATEMENTS = 3
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -85,6 +95,19 @@ DATABASES = {
     }
 }
 
+# Read replicas: DATABASES aliases that safe (GET/HEAD) requests read from;
+# writes, management commands and sessions stay on 'default'. After a client
+# writes it reads from the primary for REPLICA_PIN_SECONDS so it sees its own
+# changes. Two local SQLite files are enough to try it, e.g.
+#   DATABASES['replica'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'replica.sqlite3',
+#                           'TEST': {'MIRROR': 'default'}}
+#   REPLICA_DATABASES = ['replica']
+# rivanna/test_replica_settings.py runs the tests against such a pair.
+DATABASE_ROUTERS = ['rivannabank.routers.PrimaryReplicaRouter']
+REPLICA_DATABASES = []
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_COOKIE = 'read_primary'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -105,6 +128,75 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Seconds a successful password re-entry on deposit/check balance stays valid
+# for the session, so repeat actions skip the PBKDF2 check. 0 disables it.
+STEP_UP_AUTH_TTL = 300
+
+
+# In-process LRU cache of e-transfer recipient email -> chequing account
+RECIPIENT_CACHE_SIZE = 10000
+RECIPIENT_CACHE_TTL = 300
+
+
+# Transactions older than this many days are moved to the archive table by
+# manage.py archive_transactions; history and statements read both tables.
+TRANSACTION_ARCHIVE_AFTER_DAYS = 365
+
+
+# How long a deposit/transfer Idempotency-Key and its stored response are kept
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+# An unfinished claim older than this (seconds) belongs to a worker that died;
+# a retry may take it over. Keep it above the longest request timeout.
+IDEMPOTENCY_CLAIM_LEASE = 60
+
+
+# Login attempt limits, as (burst, seconds to refill the burst), checked before
+# any password hashing. Use CacheBucketBackend to share limits across workers.
+LOGIN_THROTTLE_BACKEND = 'rivannabank.throttling.LocalBucketBackend'
+LOGIN_THROTTLE_IP_RATE = (20, 60)
+LOGIN_THROTTLE_USERNAME_RATE = (5, 60)
+
+
+# When True, sendMoney validates and queues the transfer ('Initiated') and
+# manage.py run_transfer_workers settles it; clients poll /SendMoney/status/<id>.
+ASYNC_TRANSFERS = False
+
+
+# Live feed (Transaction-History/live): pub/sub backend, seconds between
+# keep-alive comments, and events buffered per client before it must resync.
+LIVE_EVENTS_BACKEND = 'rivannabank.events.LocalEventBackend'
+LIVE_FEED_HEARTBEAT = 15
+LIVE_FEED_QUEUE_SIZE = 100
+
+
+# Where manage.py generate_statements writes <YYYY-MM>/<customer_id>.{html,csv}.
+STATEMENT_OUTPUT_DIR = BASE_DIR / 'statements'
+
+
+# Caches. LocMemCache is a per-process, in-memory stand-in; production should
+# point 'default' at a shared cache such as
+# 'django.core.cache.backends.redis.RedisCache'.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'rivanna',
+    },
+}
+
+# Sessions are read from the cache and written through to the database, so a
+# cold or per-process cache still finds every session.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# request.customer (id, first name, account ids by type) is cached this many
+# seconds in CUSTOMER_CONTEXT_CACHE; 0 loads it from the database every request.
+CUSTOMER_CONTEXT_CACHE = 'default'
+CUSTOMER_CONTEXT_TTL = 300
+
+# Admin changelists count at most this many rows; past it, unfiltered large
+# tables show the database's row estimate instead of running COUNT(*).
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -121,32 +213,65 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# collectstatic writes content-hashed names (rivannabank.storage), so
+# everything under STATIC_ROOT can be served with
+# "Cache-Control: public, max-age=31536000, immutable". Next to each hashed
+# CSS/JS file it writes .gz/.br copies for the web server to serve pre-compressed
+# (nginx gzip_static/brotli_static). PNG/JPEG images also get WebP variants at
+# these widths, used by {% picture %}. .br copies need brotli; WebP needs Pillow.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'rivannabank.storage.OptimizedStaticFilesStorage',
+    },
+}
+STATIC_IMAGE_WIDTHS = (480, 960, 1600)
+STATIC_WEBP_QUALITY = 80
+STATIC_COMPRESS_MIN_SIZE = 512  # Bytes; smaller files gain little from compression
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-import sys
+
+# Log records are formatted as JSON lines on the calling thread and written
+# by a background thread (rivannabank.logs.QueueLogHandler), so a slow stdout
+# never blocks a request. Each line carries the request's correlation id.
+# Under `manage.py test` records are dropped, so the suite's output stays
+# readable; tests that check log lines attach their own handlers.
+TESTING = sys.argv[1:2] == ['test']
 
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'formatters': {
-        'simple': {
-            'format': '[{levelname}] {message}',
-            'style': '{',
+        'json': {
+            '()': 'rivannabank.logs.JSONFormatter',
+        },
+    },
+    'filters': {
+        'correlation_id': {
+            '()': 'rivannabank.logs.CorrelationIdFilter',
+        },
+        'sampling': {
+            '()': 'rivannabank.logs.SamplingFilter',
         },
     },
     'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
+        'console': {'class': 'logging.NullHandler'} if TESTING else {
+            'class': 'rivannabank.logs.QueueLogHandler',
             'stream': sys.stdout,
-            'formatter': 'simple',
+            'formatter': 'json',
+            'filters': ['correlation_id', 'sampling'],
         },
     },
     'root': {
         'handlers': ['console'],
-        'level': 'DEBUG',
+        'level': 'INFO',
     },
     'loggers': {
         'django': {
@@ -154,10 +279,17 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
-        'rivannabank': {  # or your app name here
+        'rivannabank': {
             'handlers': ['console'],
-            'level': 'DEBUG',
+            'level': 'DEBUG' if DEBUG else 'INFO',
             'propagate': False,
         },
     },
 }
+
+# Fraction of INFO/DEBUG records kept per logger (and its children); warnings
+# and errors are always kept. Sampling is per request, by correlation id.
+LOG_SAMPLE_RATES = {} if DEBUG else {
+    'rivannabank.instrumentation': 0.1,  # One line per request
+    'rivannabank.views': 0.1,
+}
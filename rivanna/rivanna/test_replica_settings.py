@@ -0,0 +1,20 @@
+# Settings for running the suite against a primary and a separate read
+# replica, both SQLite, so ReplicaDatabaseTests can check where reads land:
+#   python manage.py test --settings=rivanna.test_replica_settings
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    # No TEST MIRROR: the replica gets its own test database, so a read that
+    # reaches it sees its rows rather than the primary's
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica.sqlite3',
+    },
+}
+# Left empty so the test runner migrates the replica too; ReplicaDatabaseTests
+# turns routing on for itself only
+REPLICA_DATABASES = []
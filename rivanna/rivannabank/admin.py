@@ -1,9 +1,94 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import Customer, Account, Transaction, FundTransfer,Login
-
-# Register your models here.
-admin.site.register(Customer)
-admin.site.register(Account)
-admin.site.register(Transaction)
-admin.site.register(FundTransfer)
-admin.site.register(Login)
\ No newline at end of file
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .models import Customer, Account, Transaction, FundTransfer, Login
+
+
+def estimated_row_count(model, using):
+    """Return the planner's row estimate for model's table, or None where the backend has none."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [table],
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that never runs an unbounded COUNT(*) on a large table.
+
+    An unfiltered changelist uses the database's row estimate once it is past
+    ADMIN_EXACT_COUNT_LIMIT; a filtered one counts at most that many rows.
+    """
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                return estimate
+        # COUNT over a LIMIT subquery stops scanning at the limit
+        return queryset.order_by()[:limit].count()
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False  # Skips the second, unfiltered COUNT(*)
+    ordering = ('-id',)
+
+
+@admin.register(Customer)
+class CustomerAdmin(LargeTableAdmin):
+    list_display = ('id', 'full_name', 'email', 'phone', 'date_created')
+    search_fields = ('=email', '=phone')  # Unique, so indexed
+
+
+@admin.register(Account)
+class AccountAdmin(LargeTableAdmin):
+    list_display = ('id', 'customer', 'account_type', 'balance', 'date_opened')
+    list_select_related = ('customer',)
+    search_fields = ('=customer__email',)
+    raw_id_fields = ('customer',)
+    # Balances only move through services, which keep the ledger in step
+    readonly_fields = ('balance',)
+
+
+@admin.register(Transaction)
+class TransactionAdmin(LargeTableAdmin):
+    list_display = ('id', 'account', 'transaction_type', 'amount', 'status', 'date')
+    list_select_related = ('account',)
+    # Bounded date ranges on the index; date_hierarchy would scan the table for its drilldown dates
+    list_filter = ('transaction_type', 'date')
+    search_fields = ('=account__customer__email',)
+    raw_id_fields = ('account',)
+
+
+@admin.register(FundTransfer)
+class FundTransferAdmin(LargeTableAdmin):
+    list_display = ('id', '__str__', 'status', 'date')
+    # __str__ names both customers
+    list_select_related = ('sender_account__customer', 'receiver_account__customer')
+    list_filter = ('date',)
+    search_fields = ('=sender_account__customer__email', '=receiver_account__customer__email')
+    raw_id_fields = ('sender_account', 'receiver_account')
+
+
+@admin.register(Login)
+class LoginAdmin(LargeTableAdmin):
+    list_display = ('username', 'customer', 'last_login')
+    list_select_related = ('customer',)
+    search_fields = ('=username',)
+    raw_id_fields = ('customer',)
@@ -0,0 +1,149 @@
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from .models import Customer, Account, Login, Transaction
+
+
+@contextmanager
+def scratch_database(verbosity=0):
+    # Benchmarks seed a lot of rows, so they run against a throwaway test
+    # database instead of whatever DATABASES['default'] points at.
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, keepdb=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def logged_in_client(customer_id):
+    """A test client whose session already belongs to `customer_id`."""
+    client = Client()
+    session = client.session
+    session['customer_id'] = customer_id
+    session.save()
+    return client
+
+
+def seed(customers, transactions_per_account, days=365, batch_size=5000):
+    """Bulk-load customers with a Savings and a Chequing account each.
+
+    Transactions are spread evenly over the last `days` days, oldest ids
+    first, so date-ordered queries see a realistic distribution.
+    """
+    Customer.objects.bulk_create(
+        (
+            Customer(full_name=f"Bench Customer{i}", phone=f"bench-{i}", email=f"bench{i}@example.com")
+            for i in range(customers)
+        ),
+        batch_size=batch_size,
+    )
+    customer_ids = list(Customer.objects.filter(email__startswith="bench").values_list('id', flat=True))
+    Account.objects.bulk_create(
+        (
+            Account(customer_id=customer_id, account_type=account_type, balance=Decimal('1000.00'))
+            for customer_id in customer_ids
+            for account_type in ('savings', 'chequing')
+        ),
+        batch_size=batch_size,
+    )
+    account_ids = list(Account.objects.filter(customer_id__in=customer_ids).values_list('id', flat=True))
+    # Interleave accounts so each account's history spans the whole date range
+    Transaction.objects.bulk_create(
+        (
+            Transaction(
+                transaction_type='Deposit',
+                amount=Decimal('1.00'),
+                status='Completed',
+                account_id=account_id,
+                balance_after_transaction=Decimal('1000.00'),
+            )
+            for _ in range(transactions_per_account)
+            for account_id in account_ids
+        ),
+        batch_size=batch_size,
+    )
+
+    # bulk_create honours auto_now_add, so backdate the rows in id ranges
+    bounds = Transaction.objects.filter(account_id__in=account_ids).order_by('id').values_list('id', flat=True)
+    first_id, last_id = bounds.first(), bounds.last()
+    if first_id is not None:
+        now = timezone.now()
+        per_day = max(1, (last_id - first_id + 1) // days)
+        for day in range(days):
+            lo = first_id + day * per_day
+            if lo > last_id:
+                break
+            Transaction.objects.filter(id__gte=lo, id__lt=lo + per_day).update(date=now - timedelta(days=days - day))
+
+    return customer_ids, account_ids
+
+
+def seed_logins(customer_ids, password, batch_size=5000):
+    """Give every seeded customer a Login named bench<customer_id>.
+
+    The hash is computed once and shared, since PBKDF2 per row would
+    dominate the seeding time.
+    """
+    password_hash = make_password(password)
+    Login.objects.bulk_create(
+        (Login(username=f"bench{customer_id}", password_hash=password_hash, customer_id=customer_id) for customer_id in customer_ids),
+        batch_size=batch_size,
+    )
+
+
+def analyze(*models):
+    # Refresh planner statistics after a bulk load or an index change
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("ANALYZE")
+        elif connection.vendor == 'mysql':
+            for model in models:
+                cursor.execute(f"ANALYZE TABLE {model._meta.db_table}")
+
+
+def time_call(fn, repeat):
+    """Call fn `repeat` times and return latency stats in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def cpu_per_call(fn, repeat):
+    """Average process CPU time per call of fn, in milliseconds."""
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return round((time.process_time() - start) * 1000 / repeat, 3)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    if not samples:
+        return {'count': 0}
+    return {
+        'count': len(samples),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'max_ms': round(max(samples), 3),
+    }
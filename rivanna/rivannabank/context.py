@@ -0,0 +1,66 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.functional import SimpleLazyObject
+
+from .models import Customer
+
+
+def context_key(customer_id):
+    return f"customer-context:{customer_id}"
+
+
+def load_customer_context(customer_id):
+    """Return {'id', 'first_name', 'account_ids'} for a customer, or None if unknown.
+
+    account_ids maps the lowercased account type to the account id. Served
+    from the cache for CUSTOMER_CONTEXT_TTL seconds; a miss costs one
+    joined query.
+    """
+    cache = caches[settings.CUSTOMER_CONTEXT_CACHE]
+    if settings.CUSTOMER_CONTEXT_TTL:
+        context = cache.get(context_key(customer_id))
+        if context is not None:
+            return context
+
+    rows = list(Customer.objects.filter(id=customer_id).values_list('full_name', 'account__id', 'account__account_type'))
+    if not rows:
+        return None
+    context = {
+        'id': customer_id,
+        'first_name': rows[0][0].split(" ")[0],
+        'account_ids': {account_type.lower(): account_id for _, account_id, account_type in rows if account_type},
+    }
+    if settings.CUSTOMER_CONTEXT_TTL:
+        cache.set(context_key(customer_id), context, settings.CUSTOMER_CONTEXT_TTL)
+    return context
+
+
+def invalidate_customer_context(customer_id):
+    # Only reaches this process's entry when the cache is LocMemCache
+    caches[settings.CUSTOMER_CONTEXT_CACHE].delete(context_key(customer_id))
+
+
+class CustomerContextMiddleware:
+    """Attach request.customer, the logged-in customer's cached context.
+
+    The context is loaded lazily, at most once per request, so views that
+    never touch it pay nothing. It is falsy when nobody is logged in.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.customer = SimpleLazyObject(lambda: self.load(request))
+        # Under ASGI this hands back get_response's coroutine for the caller to await
+        return self.get_response(request)
+
+    def load(self, request):
+        customer_id = request.session.get('customer_id')
+        return load_customer_context(customer_id) if customer_id is not None else None
@@ -0,0 +1,148 @@
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    """One live-feed client: a bounded queue owned by the client's event loop.
+
+    Publishers may run on any thread, so events are handed to the loop with
+    call_soon_threadsafe. A client that falls QUEUE_SIZE events behind has
+    its backlog replaced by a single 'resync' event instead of slowing the
+    write path down.
+    """
+
+    def __init__(self, channels, maxsize):
+        self.channels = tuple(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def deliver(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = {'type': 'resync'}
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class LocalEventBackend:
+    """Fan events out to subscribers in this process; the default backend.
+
+    It only sees writes made by the same process, so a deployment with
+    several server or worker processes needs a shared backend (Redis
+    pub/sub, Postgres LISTEN/NOTIFY) exposing the same subscribe,
+    unsubscribe and publish methods.
+    """
+
+    def __init__(self):
+        self._channels = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels):
+        subscription = Subscription(channels, settings.LIVE_FEED_QUEUE_SIZE)
+        with self._lock:
+            for channel in subscription.channels:
+                self._channels[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.deliver(event)
+            except RuntimeError:
+                # The client's event loop is gone
+                self.unsubscribe(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({subscription for subscribers in self._channels.values() for subscription in subscribers})
+
+    def reset(self):
+        with self._lock:
+            self._channels.clear()
+
+
+class EventBus:
+    """Balance and transaction events, published per account id."""
+
+    def __init__(self):
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = import_string(settings.LIVE_EVENTS_BACKEND)()
+        return self._backend
+
+    def subscribe(self, account_ids):
+        return self.backend.subscribe([f"account:{account_id}" for account_id in account_ids])
+
+    def unsubscribe(self, subscription):
+        self.backend.unsubscribe(subscription)
+
+    def publish(self, events):
+        for event in events:
+            self.backend.publish(f"account:{event['account_id']}", event)
+
+    def stats(self):
+        return {'subscribers': self.backend.subscriber_count()}
+
+    def reset(self):
+        self.backend.reset()
+        self._backend = None
+
+
+event_bus = EventBus()
+
+
+def publish_transactions(transactions):
+    """Announce new Transaction rows, and the balances they leave, after commit.
+
+    Called by every write path that creates transactions; nothing is sent
+    if the surrounding database transaction rolls back.
+    """
+    events, balances = [], {}
+    for tx in transactions:
+        events.append({
+            'type': 'transaction',
+            'account_id': tx.account_id,
+            'id': tx.id,
+            'date': tx.date,
+            'transaction_type': tx.transaction_type,
+            'amount': tx.amount,
+            'status': tx.status,
+            'balance_after_transaction': tx.balance_after_transaction,
+        })
+        balances[tx.account_id] = tx.balance_after_transaction
+    publish_balances(balances, events)
+
+
+def publish_balances(balances, events=()):
+    """Announce {account_id: balance} (plus any extra events) after commit."""
+    events = list(events) + [
+        {'type': 'balance', 'account_id': account_id, 'balance': balance}
+        for account_id, balance in balances.items()
+    ]
+    if events:
+        transaction.on_commit(lambda: event_bus.publish(events))
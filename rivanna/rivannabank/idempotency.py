@@ -0,0 +1,98 @@
+import uuid
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+FORM_FIELD = 'idempotency_key'
+
+
+def new_key():
+    # Token rendered into forms so a resubmitted form reuses the same key
+    return uuid.uuid4().hex
+
+
+def replay(record):
+    response = HttpResponse(record.body, status=record.status_code, content_type=record.content_type)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(scope):
+    """Make a POST view safe to retry with an Idempotency-Key header or form token.
+
+    A repeat of a completed request is answered from the stored response
+    after one indexed lookup on (customer, key). A repeat that arrives while
+    the first attempt is still running gets a 409; once that claim is older
+    than IDEMPOTENCY_CLAIM_LEASE (the worker died), the repeat takes it
+    over and runs the view itself. Only final 2xx responses
+    are stored. Anything else releases the key, so the client can retry for
+    real; views must therefore answer failures (insufficient funds, unknown
+    recipient, database errors) with a non-2xx status.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            customer_id = request.session.get('customer_id')
+            key = request.headers.get(HEADER) or request.POST.get(FORM_FIELD)
+            if request.method != 'POST' or not key or customer_id is None:
+                return view(request, *args, **kwargs)
+            if len(key) > 64:
+                return JsonResponse({'error': f"{HEADER} must be at most 64 characters."}, status=400)
+
+            now = timezone.now()
+            record = IdempotencyKey.objects.filter(customer_id=customer_id, key=key).first()
+            if record is not None and record.expires_at <= now:
+                record.delete()
+                record = None
+            if record is None:
+                try:
+                    record = IdempotencyKey.objects.create(
+                        customer_id=customer_id,
+                        key=key,
+                        scope=scope,
+                        claimed_at=now,
+                        expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                    )
+                except IntegrityError:
+                    # A concurrent retry claimed the key first
+                    record = IdempotencyKey.objects.get(customer_id=customer_id, key=key)
+                else:
+                    return run_and_store(record, view, request, *args, **kwargs)
+
+            if record.scope != scope:
+                return JsonResponse({'error': f"{HEADER} was already used for a different request."}, status=422)
+            if record.status_code is None:
+                lease_start = now - timedelta(seconds=settings.IDEMPOTENCY_CLAIM_LEASE)
+                # Only one retry can move claimed_at forward, so only one takes a stale claim over
+                if record.claimed_at > lease_start or not IdempotencyKey.objects.filter(
+                    pk=record.pk, status_code__isnull=True, claimed_at=record.claimed_at,
+                ).update(claimed_at=now):
+                    return JsonResponse({'error': 'A request with this key is still being processed.'}, status=409)
+                record.claimed_at = now
+                return run_and_store(record, view, request, *args, **kwargs)
+            return replay(record)
+        return wrapper
+    return decorator
+
+
+def run_and_store(record, view, request, *args, **kwargs):
+    try:
+        response = view(request, *args, **kwargs)
+    except BaseException:
+        record.delete()
+        raise
+    if 200 <= response.status_code < 300 and not response.streaming:
+        record.status_code = response.status_code
+        record.content_type = response.get('Content-Type', '')
+        record.body = response.content.decode(response.charset)
+        record.save(update_fields=['status_code', 'content_type', 'body'])
+    else:
+        record.delete()
+    return response
@@ -0,0 +1,122 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def query_budget(limit):
+    """Declare the most SQL statements a view may run per request.
+
+    The budget is enforced by QueryBudgetTestMixin in tests and logged as a
+    warning by SQLInstrumentationMiddleware when a live request exceeds it.
+    """
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+class QueryStats:
+    def __init__(self, keep_slowest):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = []
+        self.keep_slowest = keep_slowest
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.total += elapsed
+            if self.keep_slowest:
+                self.slowest.append((elapsed, context['connection'].alias, sql))
+                self.slowest.sort(key=lambda item: item[0], reverse=True)
+                del self.slowest[self.keep_slowest:]
+
+
+class SQLInstrumentationMiddleware:
+    """Count every SQL statement a request runs and how long the database took.
+
+    Each request emits one structured JSON log line. With
+    SQL_INSTRUMENTATION_HEADERS on, the totals are also sent as X-DB-Queries,
+    X-DB-Time-ms and Server-Timing response headers. Streaming responses are
+    only measured up to the point the view returns.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Stay async under ASGI so async views (the live feed) keep no thread per request
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, start = self.start(request)
+        with self.wrap_connections(stats):
+            response = self.get_response(request)
+        return self.finish(request, response, stats, start)
+
+    async def __acall__(self, request):
+        stats, start = self.start(request)
+        # Async views reach the database through sync_to_async on the request's
+        # thread-sensitive thread; connections are per thread, so wrap that thread's
+        wrappers = await sync_to_async(self.wrap_connections)(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(wrappers.close)()
+        return self.finish(request, response, stats, start)
+
+    def start(self, request):
+        request.query_stats = QueryStats(settings.SQL_SLOWEST_STATEMENTS)
+        return request.query_stats, time.perf_counter()
+
+    def wrap_connections(self, stats):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+        return stack
+
+    def finish(self, request, response, stats, start):
+        elapsed = time.perf_counter() - start
+
+        db_ms = round(stats.total * 1000, 3)
+        budget = getattr(request, 'query_budget', None)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': stats.count,
+            'db_ms': db_ms,
+            'total_ms': round(elapsed * 1000, 3),
+            'query_budget': budget,
+            'slowest': [
+                {'ms': round(duration * 1000, 3), 'db': alias, 'sql': sql[:500]}
+                for duration, alias, sql in stats.slowest
+            ],
+        }
+        if budget is not None and stats.count > budget:
+            logger.warning("Query budget exceeded", extra=record)
+        else:
+            logger.info("Request completed", extra=record)
+
+        if settings.SQL_INSTRUMENTATION_HEADERS:
+            response['X-DB-Queries'] = str(stats.count)
+            response['X-DB-Time-ms'] = str(db_ms)
+            response['Server-Timing'] = f"db;dur={db_ms};desc=\"{stats.count} queries\""
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, 'query_budget', None)
@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+import weakref
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+_correlation_id = ContextVar('correlation_id', default=None)
+
+# Accept a caller's X-Request-ID only if it is short and safe to log
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# Attributes every LogRecord has; anything else was passed in extra=
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'correlation_id'}
+
+
+def get_correlation_id():
+    return _correlation_id.get()
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, correlation_id and any extra= fields."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'correlation_id': getattr(record, 'correlation_id', None),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class CorrelationIdFilter(logging.Filter):
+    # Handler filters run on the caller's thread before the record is queued, so this sees the request's context
+    def filter(self, record):
+        # django.request logs after the middleware returns, but passes the request along
+        record.correlation_id = _correlation_id.get() or getattr(getattr(record, 'request', None), 'correlation_id', None)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a LOG_SAMPLE_RATES fraction of INFO and DEBUG records per logger.
+
+    Rates apply to a logger and its children; warnings and errors are always
+    kept. Within a request the choice is made from the correlation id, so a
+    kept request keeps all of its lines.
+    """
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate(record.name)
+        if rate >= 1:
+            return True
+        correlation_id = getattr(record, 'correlation_id', None) or _correlation_id.get()
+        if correlation_id is None:
+            return random.random() < rate
+        return zlib.crc32(correlation_id.encode()) / 2 ** 32 < rate
+
+    def rate(self, name):
+        rates = settings.LOG_SAMPLE_RATES
+        while name:
+            if name in rates:
+                return rates[name]
+            name = name.rpartition('.')[0]
+        return 1
+
+
+# Live QueueLogHandlers; a forked child has their queues but not their writer threads
+_queue_handlers = weakref.WeakSet()
+
+
+def _restart_queue_handlers():
+    for handler in list(_queue_handlers):
+        handler.start()
+
+
+os.register_at_fork(after_in_child=_restart_queue_handlers)
+
+
+class FlushingQueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # Only sent at shutdown: wait for room so every queued record is written
+        self.queue.put(self._sentinel)
+
+
+class QueueLogHandler(QueueHandler):
+    """Format records on the caller's thread and write them from a background thread.
+
+    The queue is bounded and never waited on: when the writer falls behind,
+    records are dropped (and counted) rather than blocking a request.
+    """
+
+    def __init__(self, stream=None, maxsize=10000):
+        self.stream = stream or sys.stdout
+        self.maxsize = maxsize
+        self.dropped = 0
+        super().__init__(None)
+        self.start()
+        _queue_handlers.add(self)
+
+    def start(self):
+        self.queue = queue.Queue(self.maxsize)
+        self.listener = FlushingQueueListener(self.queue, logging.StreamHandler(self.stream))
+        self.listener.start()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        _queue_handlers.discard(self)
+        super().close()
+
+
+class CorrelationIdMiddleware:
+    """Give each request a correlation id for its log lines and echo it as X-Request-ID."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _correlation_id.set(self.correlation_id(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _correlation_id.reset(token)
+        response['X-Request-ID'] = request.correlation_id
+        return response
+
+    async def __acall__(self, request):
+        token = _correlation_id.set(self.correlation_id(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _correlation_id.reset(token)
+        response['X-Request-ID'] = request.correlation_id
+        return response
+
+    def correlation_id(self, request):
+        request_id = request.headers.get('x-request-id', '')
+        request.correlation_id = request_id if REQUEST_ID_PATTERN.match(request_id) else uuid.uuid4().hex
+        return request.correlation_id
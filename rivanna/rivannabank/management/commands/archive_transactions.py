@@ -0,0 +1,39 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from rivannabank import services
+
+
+class Command(BaseCommand):
+    help = "Move transactions older than the archive age from the hot table to the archive table in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=settings.TRANSACTION_ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--stop-after-empty', type=int, default=3,
+            help="Stop after this many consecutive batches with nothing old enough to archive.",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+        self.stdout.write(f"Archiving transactions dated before {cutoff:%Y-%m-%d %H:%M}...")
+
+        start = time.perf_counter()
+        archived, after_id, empty_batches = 0, 0, 0
+        # Ids roughly follow dates, so a run of batches with nothing to move
+        # means the scan has reached the recent end of the table.
+        while empty_batches < options['stop_after_empty']:
+            moved, after_id = services.archive_transaction_batch(cutoff, after_id, options['batch_size'])
+            if after_id is None:
+                break
+            archived += moved
+            empty_batches = 0 if moved else empty_batches + 1
+            if moved:
+                self.stdout.write(f"  {archived} archived (through id {after_id})")
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} transactions in {time.perf_counter() - start:.1f}s."))
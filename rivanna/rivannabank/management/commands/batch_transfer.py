@@ -0,0 +1,46 @@
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from rivannabank import services
+from rivannabank.models import Account
+
+
+class Command(BaseCommand):
+    help = "Send a CSV (email,amount) or JSON list of e-transfers from one account in a single batch."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSON file of transfers.")
+        parser.add_argument('--account-id', type=int, required=True, help="Sender account id.")
+        parser.add_argument('--format', choices=['csv', 'json'], help="Defaults to the file extension.")
+        parser.add_argument('--report', help="Write the per-row result report to this JSON file.")
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        fmt = options['format'] or path.suffix.lstrip('.').lower()
+        try:
+            rows = services.read_transfer_rows(path.read_text(encoding='utf-8-sig'), fmt)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read transfers from {path}: {e}")
+
+        start = time.perf_counter()
+        try:
+            results = services.batch_transfer(options['account_id'], rows)
+        except Account.DoesNotExist as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - start
+
+        if options['report']:
+            Path(options['report']).write_text(json.dumps(results, cls=DjangoJSONEncoder, indent=2))
+        for result in results:
+            if result['status'] != 'Completed':
+                self.stdout.write(self.style.WARNING(f"Row {result['row']} ({result['email']}): {result['error']}"))
+
+        completed = sum(1 for result in results if result['status'] == 'Completed')
+        rate = len(results) / elapsed if elapsed else float('inf')
+        self.stdout.write(self.style.SUCCESS(
+            f"{completed}/{len(results)} transfers completed in {elapsed:.2f}s ({rate:.0f} transfers/s)."
+        ))
@@ -0,0 +1,127 @@
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rivannabank.benchmarks import scratch_database, seed, seed_logins, summarize
+from rivannabank.caching import recipient_cache
+from rivannabank.models import Account
+from rivannabank.throttling import login_throttle
+
+PASSWORD = 'bench-password'
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database and drive login, deposit, sendMoney, checkBalance and "
+        "transactionHistory from several threads, reporting latency, throughput and SQL counts per view."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=200)
+        parser.add_argument('--transactions', type=int, default=20, help="Seeded transactions per account.")
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--iterations', type=int, default=25, help="Rounds of every view per thread.")
+        parser.add_argument('--output', help="JSON report path. Defaults to bench-<timestamp>.json.")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.stdout.write(f"Seeding {options['customers']} customers...")
+            customer_ids, _ = seed(options['customers'], options['transactions'])
+            seed_logins(customer_ids, PASSWORD)
+            recipient_cache.clear()
+            login_throttle.reset()
+            emails = dict(Account.objects.filter(customer_id__in=customer_ids).values_list('customer_id', 'customer__email'))
+
+            samples = defaultdict(list)
+            queries = defaultdict(list)
+            errors = defaultdict(int)
+            lock = threading.Lock()
+
+            def record(name, response_ok, elapsed, query_count):
+                with lock:
+                    samples[name].append(elapsed)
+                    queries[name].append(query_count)
+                    if not response_ok:
+                        errors[name] += 1
+
+            def call(name, request):
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    try:
+                        response = request()
+                        ok = response.status_code < 400
+                    except Exception:
+                        ok = False
+                    elapsed = (time.perf_counter() - start) * 1000
+                record(name, ok, elapsed, len(captured))
+
+            def user(seed_value):
+                rng = random.Random(seed_value)
+                client = Client()
+                customer_id = rng.choice(customer_ids)
+                try:
+                    call('login', lambda: client.post('/Login', {'username': f"bench{customer_id}", 'password': PASSWORD}))
+                    for _ in range(options['iterations']):
+                        recipient = emails[rng.choice(customer_ids)]
+                        call('deposit', lambda: client.post('/Deposit', {
+                            'amount': '5.00', 'account_type': 'chequing', 'password': PASSWORD,
+                        }))
+                        call('sendMoney', lambda: client.post('/SendMoney', {
+                            'amount': '1.00', 'account_type': 'chequing', 'email': recipient,
+                        }))
+                        call('checkBalance', lambda: client.post('/Check-Balance', {
+                            'account_type': 'savings', 'password': PASSWORD,
+                        }, headers={'x-requested-with': 'XMLHttpRequest'}))
+                        call('transactionHistory', lambda: client.get('/Transaction-History'))
+                finally:
+                    connection.close()
+
+            threads = [threading.Thread(target=user, args=(i,)) for i in range(options['threads'])]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wall = time.perf_counter() - started
+
+        report = {
+            'run_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'config': {key: options[key] for key in ('customers', 'transactions', 'threads', 'iterations')},
+            'wall_seconds': round(wall, 3),
+            'throughput_rps': round(sum(len(values) for values in samples.values()) / wall, 2),
+            'caches': {'recipient': recipient_cache.stats()},
+            'login_throttle': login_throttle.stats(),
+            'views': {
+                name: {
+                    **summarize(samples[name]),
+                    'throughput_rps': round(len(samples[name]) / wall, 2),
+                    'queries_mean': round(sum(queries[name]) / len(queries[name]), 2),
+                    'queries_max': max(queries[name]),
+                    'errors': errors[name],
+                }
+                for name in samples
+            },
+        }
+
+        output = Path(options['output'] or f"bench-{timezone.now():%Y%m%d-%H%M%S}.json")
+        output.write_text(json.dumps(report, indent=2))
+
+        self.stdout.write(f"{'view':<20}{'p50':>9}{'p95':>9}{'p99':>9}{'rps':>9}{'queries':>9}{'errors':>8}")
+        for name, stats in report['views'].items():
+            self.stdout.write(
+                f"{name:<20}{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}"
+                f"{stats['throughput_rps']:>9}{stats['queries_mean']:>9}{stats['errors']:>8}"
+            )
+        self.stdout.write(f"recipient cache: {report['caches']['recipient']}")
+        self.stdout.write(f"login throttle: {report['login_throttle']}")
+        self.stdout.write(self.style.SUCCESS(f"{report['throughput_rps']} requests/s overall; report written to {output}"))
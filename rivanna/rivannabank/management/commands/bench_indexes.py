@@ -0,0 +1,79 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from rivannabank.benchmarks import analyze, scratch_database, seed, time_call
+from rivannabank.models import Account, Transaction
+
+
+class Command(BaseCommand):
+    help = "Seed a scratch database and compare query plans/timings of the hot lookups with and without their composite indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=2000)
+        parser.add_argument('--transactions', type=int, default=50, help="Transactions per account.")
+        parser.add_argument('--repeat', type=int, default=200, help="Timed runs per query.")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.stdout.write(f"Seeding {options['customers']} customers...")
+            customer_ids, account_ids = seed(options['customers'], options['transactions'])
+
+            rng = random.Random(0)
+            samples = [(rng.choice(customer_ids), rng.choice(account_ids)) for _ in range(options['repeat'])]
+            queries = self.hot_queries()
+
+            indexes = [(model, index) for model in (Account, Transaction) for index in model._meta.indexes]
+            with connection.schema_editor() as editor:
+                for model, index in indexes:
+                    editor.remove_index(model, index)
+            analyze(Account, Transaction)
+            before = self.measure(queries, samples, customer_ids[0], account_ids[0])
+
+            with connection.schema_editor() as editor:
+                for model, index in indexes:
+                    editor.add_index(model, index)
+            analyze(Account, Transaction)
+            after = self.measure(queries, samples, customer_ids[0], account_ids[0])
+
+        report = {name: {'before': before[name], 'after': after[name]} for name in queries}
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        for name, result in report.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for label in ('before', 'after'):
+                timing = result[label]['timing']
+                self.stdout.write(f"  {label}: p50={timing['p50_ms']}ms p95={timing['p95_ms']}ms p99={timing['p99_ms']}ms")
+                for line in result[label]['plan'].splitlines():
+                    self.stdout.write(f"    {line}")
+
+    def hot_queries(self):
+        # The lookups behind deposit/checkBalance/sendMoney and transactionHistory
+        return {
+            'account_by_customer_and_type': lambda customer_id, account_id: (
+                Account.objects.filter(customer_id=customer_id, account_type='chequing').values('id', 'balance')
+            ),
+            'account_history_newest_first': lambda customer_id, account_id: (
+                Transaction.objects.filter(account_id=account_id).order_by('-date')[:25]
+            ),
+            'customer_history_newest_first': lambda customer_id, account_id: (
+                Transaction.objects.filter(
+                    account_id__in=Account.objects.filter(customer_id=customer_id).values('id')
+                ).order_by('-date', '-id')[:25]
+            ),
+        }
+
+    def measure(self, queries, samples, customer_id, account_id):
+        results = {}
+        for name, build in queries.items():
+            params = iter(samples)
+            results[name] = {
+                'plan': build(customer_id, account_id).explain(),
+                'timing': time_call(lambda: list(build(*next(params))), len(samples)),
+            }
+        return results
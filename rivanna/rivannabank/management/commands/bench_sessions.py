@@ -0,0 +1,73 @@
+import json
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from rivannabank.benchmarks import logged_in_client, scratch_database, time_call
+from rivannabank.models import Customer, Account, Login
+
+PASSWORD = 'bench-password'
+
+MODES = {
+    # What every request paid before: a session row read and a Customer/Account lookup
+    'db_sessions': {'SESSION_ENGINE': 'django.contrib.sessions.backends.db', 'CUSTOMER_CONTEXT_TTL': 0},
+    'cached_sessions_and_context': {},
+}
+
+
+class Command(BaseCommand):
+    help = "Compare SQL queries and latency per request with database sessions versus cached sessions and customer context."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help="Requests per view and mode.")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        repeat = options['requests']
+        report = {}
+        with scratch_database():
+            customer = Customer.objects.create(full_name="Bench User", phone="bench", email="bench@example.com")
+            Login.objects.create(username="bench", password_hash=make_password(PASSWORD), customer=customer)
+            Account.objects.create(customer=customer, account_type='chequing', balance=Decimal('1000000.00'))
+            recipient = Customer.objects.create(full_name="Bench Recipient", phone="bench-2", email="recipient@example.com")
+            Account.objects.create(customer=recipient, account_type='chequing')
+
+            for mode, overrides in MODES.items():
+                with override_settings(**overrides):
+                    caches['default'].clear()
+                    client = logged_in_client(customer.id)
+                    # Opens the step-up window so deposits skip the password hash
+                    client.post('/Deposit', {'account_type': 'chequing', 'password': PASSWORD, 'amount': '1.00'})
+                    views = {
+                        'home': lambda: client.get('/'),
+                        'deposit': lambda: client.post('/Deposit', {'account_type': 'chequing', 'amount': '1.00'}),
+                        'sendMoney': lambda: client.post('/SendMoney', {
+                            'account_type': 'chequing', 'amount': '1.00', 'email': 'recipient@example.com',
+                        }),
+                    }
+                    for name, request in views.items():
+                        request()  # Warm the caches
+                        with CaptureQueriesContext(connection) as queries:
+                            request()
+                        report.setdefault(name, {})[mode] = {
+                            'queries': len(queries),
+                            'latency': time_call(request, repeat),
+                        }
+
+        for result in report.values():
+            result['queries_saved'] = result['db_sessions']['queries'] - result['cached_sessions_and_context']['queries']
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for name, result in report.items():
+            before, after = result['db_sessions'], result['cached_sessions_and_context']
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(f"  database sessions:          {before['queries']} queries p50={before['latency']['p50_ms']}ms")
+            self.stdout.write(f"  cached session and context: {after['queries']} queries p50={after['latency']['p50_ms']}ms")
+            self.stdout.write(self.style.SUCCESS(f"  Queries saved per request: {result['queries_saved']}"))
@@ -0,0 +1,58 @@
+import json
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from rivannabank.benchmarks import cpu_per_call, logged_in_client, scratch_database, time_call
+from rivannabank.models import Customer, Account, Login
+
+PASSWORD = 'bench-password'
+
+
+class Command(BaseCommand):
+    help = "Measure per-request CPU and latency of checkBalance/deposit with and without the step-up session window."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help="Requests per view and mode.")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        repeat = options['requests']
+        with scratch_database():
+            customer = Customer.objects.create(full_name="Bench User", phone="bench", email="bench@example.com")
+            Login.objects.create(username="bench", password_hash=make_password(PASSWORD), customer=customer)
+            Account.objects.create(customer=customer, account_type='chequing')
+            client = logged_in_client(customer.id)
+
+            views = {
+                'checkBalance': lambda: client.post('/Check-Balance', {
+                    'account_type': 'chequing', 'password': PASSWORD,
+                }, headers={'x-requested-with': 'XMLHttpRequest'}),
+                'deposit': lambda: client.post('/Deposit', {
+                    'account_type': 'chequing', 'password': PASSWORD, 'amount': '1.00',
+                }),
+            }
+
+            report = {}
+            for name, request in views.items():
+                with override_settings(STEP_UP_AUTH_TTL=0):
+                    cold = {'cpu_ms': cpu_per_call(request, repeat), 'latency': time_call(request, repeat)}
+                # One re-authentication opens the window; the timed requests then skip hashing
+                request()
+                warm = {'cpu_ms': cpu_per_call(request, repeat), 'latency': time_call(request, repeat)}
+                report[name] = {
+                    'password_every_request': cold,
+                    'step_up_window': warm,
+                    'cpu_saved_ms': round(cold['cpu_ms'] - warm['cpu_ms'], 3),
+                }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for name, result in report.items():
+            cold, warm = result['password_every_request'], result['step_up_window']
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(f"  password every request: cpu={cold['cpu_ms']}ms p50={cold['latency']['p50_ms']}ms")
+            self.stdout.write(f"  step-up window:         cpu={warm['cpu_ms']}ms p50={warm['latency']['p50_ms']}ms")
+            self.stdout.write(self.style.SUCCESS(f"  CPU saved per request: {result['cpu_saved_ms']}ms"))
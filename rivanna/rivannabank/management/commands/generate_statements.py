@@ -0,0 +1,68 @@
+import os
+import shutil
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from rivannabank import statements
+from rivannabank.parallel import run_partitioned
+
+
+def previous_month():
+    first = timezone.localdate().replace(day=1)
+    return (first - timedelta(days=1)).strftime('%Y-%m')
+
+
+class Command(BaseCommand):
+    help = "Write every customer's monthly statement to disk, one customer id range per pool worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', default=previous_month(), help="YYYY-MM; defaults to last month.")
+        parser.add_argument('--output-dir', default=str(settings.STATEMENT_OUTPUT_DIR))
+        parser.add_argument('--formats', default=','.join(statements.STATEMENT_FORMATS), help="Comma-separated: html, csv.")
+        parser.add_argument('--processes', type=int, default=os.cpu_count())
+        parser.add_argument('--partition-size', type=int, default=500, help="Customers per worker task.")
+        parser.add_argument('--restart', action='store_true', help="Ignore checkpoints from an earlier run of this month.")
+
+    def handle(self, *args, **options):
+        month = options['month']
+        try:
+            statements.month_range(month)
+        except ValueError:
+            raise CommandError(f"--month must look like 2024-01, not {month!r}")
+        formats = tuple(fmt.strip() for fmt in options['formats'].split(',') if fmt.strip())
+        if not formats or set(formats) - set(statements.STATEMENT_FORMATS):
+            raise CommandError(f"--formats must be drawn from {', '.join(statements.STATEMENT_FORMATS)}")
+
+        month_dir = os.path.join(options['output_dir'], month)
+        if options['restart']:
+            shutil.rmtree(os.path.join(month_dir, '.done'), ignore_errors=True)
+        os.makedirs(os.path.join(month_dir, '.done'), exist_ok=True)
+        recorded = statements.pin_partition_size(month_dir, options['partition_size'])
+        if recorded is not None:
+            raise CommandError(
+                f"{month_dir} has checkpoints for --partition-size {recorded}; "
+                f"resume with that size or pass --restart."
+            )
+
+        pending = [
+            (low, high) for low, high in statements.partitions(options['partition_size'])
+            if not os.path.exists(statements.checkpoint_path(month_dir, low, high))
+        ]
+        self.stdout.write(f"Generating {month} statements in {month_dir}: {len(pending)} partitions to go.")
+
+        start = time.perf_counter()
+        written = 0
+        tasks = [(month, low, high, month_dir, formats) for low, high in pending]
+        for result in run_partitioned(statements.generate_partition, tasks, options['processes']):
+            written += self.report(*result)
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} statements in {time.perf_counter() - start:.1f}s."))
+
+    def report(self, low, high, count):
+        if count:
+            self.stdout.write(f"  customers {low}-{high - 1}: {count} statements")
+        return count
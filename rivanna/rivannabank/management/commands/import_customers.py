@@ -0,0 +1,60 @@
+import csv
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rivannabank import services
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a CSV of customers (full_name, phone, email, address, username and "
+        "password_hash or password) and onboard them in bulk, chunk by chunk."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file with a header row.")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--skipped', help="Write skipped rows and reasons to this CSV file.")
+
+    def handle(self, *args, **options):
+        try:
+            source = open(options['path'], newline='', encoding='utf-8-sig')
+        except OSError as e:
+            raise CommandError(f"Could not open {options['path']}: {e}")
+
+        created = skipped = 0
+        skipped_writer = None
+        skipped_file = open(options['skipped'], 'w', newline='') if options['skipped'] else None
+        start = time.perf_counter()
+        try:
+            reader = csv.DictReader(source)
+            if skipped_file:
+                skipped_writer = csv.writer(skipped_file)
+                skipped_writer.writerow([*reader.fieldnames, 'reason'])
+            while True:
+                chunk = list(islice(reader, options['chunk_size']))
+                if not chunk:
+                    break
+                chunk_created, chunk_skipped = services.import_customers(chunk)
+                created += chunk_created
+                skipped += len(chunk_skipped)
+                if skipped_writer:
+                    for row, reason in chunk_skipped:
+                        skipped_writer.writerow([*(row.get(field) for field in reader.fieldnames), reason])
+
+                elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f"{created + skipped} rows processed: {created} created, {skipped} skipped "
+                    f"({(created + skipped) / elapsed:.0f} rows/s)"
+                )
+        finally:
+            source.close()
+            if skipped_file:
+                skipped_file.close()
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {created} customers in {elapsed:.1f}s ({created / elapsed if elapsed else 0:.0f} customers/s); {skipped} skipped."
+        ))
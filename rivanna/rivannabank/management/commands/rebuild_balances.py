@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from rivannabank import services
+from rivannabank.models import Account
+from rivannabank.parallel import id_ranges
+
+
+class Command(BaseCommand):
+    help = "Recompute cached Account.balance values from the append-only ledger, one account id range at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Accounts per id range.")
+        parser.add_argument('--check', action='store_true', help="Only report drift; do not rewrite balances.")
+        parser.add_argument('--verify-journals', action='store_true', help="Also check that every journal balances.")
+
+    def handle(self, *args, **options):
+        drifted = 0
+        for start_id, end_id in id_ranges(Account, options['batch_size']):
+            drift = services.rebuild_balances(start_id, end_id, apply=not options['check'])
+            drifted += len(drift)
+            for account_id, (cached, ledger) in sorted(drift.items()):
+                self.stdout.write(self.style.WARNING(f"Account {account_id}: cached {cached}, ledger {ledger}"))
+
+        if options['verify_journals']:
+            unbalanced = services.unbalanced_journals()
+            for journal in unbalanced:
+                self.stdout.write(self.style.ERROR(f"Journal {journal} does not balance"))
+            if unbalanced:
+                self.stdout.write(self.style.ERROR(f"{len(unbalanced)} unbalanced journals."))
+
+        action = "found" if options['check'] else "rebuilt"
+        self.stdout.write(self.style.SUCCESS(f"{drifted} drifted balances {action}."))
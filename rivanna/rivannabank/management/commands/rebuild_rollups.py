@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from rivannabank import services
+from rivannabank.models import Account
+from rivannabank.parallel import id_ranges
+
+
+class Command(BaseCommand):
+    help = "Recompute the DailyRollup analytics table from the hot and archive transaction tables, one account id range at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Accounts per id range.")
+
+    def handle(self, *args, **options):
+        rollups = 0
+        for start_id, end_id in id_ranges(Account, options['batch_size']):
+            rollups += services.rebuild_rollups(start_id, end_id)
+            self.stdout.write(f"  accounts {start_id}-{end_id - 1}: {rollups} rollup rows so far")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rollups} daily rollup rows."))
@@ -0,0 +1,51 @@
+import csv
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from rivannabank import services
+from rivannabank.models import Account
+from rivannabank.parallel import id_ranges, run_partitioned
+
+
+def reconcile_range(start_id, end_id, full):
+    # Pool task: return the range with its result so the parent can report progress
+    return (start_id, end_id, *services.reconcile_range(start_id, end_id, full))
+
+
+class Command(BaseCommand):
+    help = "Check cached balances against the ledger, the transaction history and the last running balance, in parallel id ranges."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Accounts per id range.")
+        parser.add_argument('--processes', type=int, default=os.cpu_count())
+        parser.add_argument('--full', action='store_true', help="Check every account, not only those with activity since their last clean check.")
+        parser.add_argument('--report', help="Discrepancy report path (CSV); defaults to reconcile-<timestamp>.csv.")
+
+    def handle(self, *args, **options):
+        tasks = [(start_id, end_id, options['full']) for start_id, end_id in id_ranges(Account, options['batch_size'])]
+
+        start = time.perf_counter()
+        checked, discrepancies = 0, []
+        for result in run_partitioned(reconcile_range, tasks, options['processes']):
+            checked += self.collect(result, discrepancies)
+
+        report = options['report'] or f"reconcile-{timezone.now():%Y%m%d-%H%M%S}.csv"
+        with open(report, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['account_id', 'check', 'cached_balance', 'expected'])
+            writer.writerows(sorted(discrepancies))
+
+        summary = f"Checked {checked} accounts in {time.perf_counter() - start:.1f}s; {len(discrepancies)} discrepancies written to {report}."
+        self.stdout.write(self.style.ERROR(summary) if discrepancies else self.style.SUCCESS(summary))
+
+    def collect(self, result, discrepancies):
+        start_id, end_id, checked, found = result
+        for account_id, check, cached, expected in found:
+            self.stdout.write(self.style.WARNING(f"Account {account_id}: {check} says {expected}, cached {cached}"))
+        discrepancies += found
+        if checked:
+            self.stdout.write(f"  accounts {start_id}-{end_id - 1}: {checked} checked")
+        return checked
@@ -0,0 +1,78 @@
+import logging
+import multiprocessing
+import signal
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from rivannabank.parallel import close_connections_before_fork
+
+logger = logging.getLogger(__name__)
+
+
+def run_worker(batch_size, poll_interval, once, stop):
+    """Settle queued transfers until `stop` is set (or, with once, the queue is empty)."""
+    from rivannabank import services
+
+    completed = failed = 0
+    while not stop.is_set():
+        counts = services.process_transfer_queue(batch_size)
+        completed += counts['Completed']
+        failed += counts['Failed']
+        if counts['Completed'] or counts['Failed']:
+            logger.info("Transfer batch settled: %(Completed)d completed, %(Failed)d failed", counts)
+            continue
+        if once:
+            break
+        stop.wait(poll_interval)
+    return completed, failed
+
+
+def worker_process(*args):
+    # Ctrl-C reaches every process in the group; only the parent decides when to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    django.setup()  # No-op when forked, required under the spawn start method
+    try:
+        run_worker(*args)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Run a pool of worker processes that settle queued ('Initiated') e-transfers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2)
+        parser.add_argument('--batch-size', type=int, default=100, help="Transfers claimed per database transaction.")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is drained.")
+
+    def handle(self, *args, **options):
+        stop = multiprocessing.Event()
+        worker_args = (options['batch_size'], options['poll_interval'], options['once'], stop)
+
+        if options['processes'] <= 1:
+            completed, failed = run_worker(*worker_args)
+            self.stdout.write(self.style.SUCCESS(f"{completed} transfers completed, {failed} failed."))
+            return
+
+        # Forked workers inherit this, so SIGTERM lets every batch in flight commit
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        close_connections_before_fork()
+        workers = [
+            multiprocessing.Process(target=worker_process, args=worker_args, name=f"transfer-worker-{number}")
+            for number in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {len(workers)} transfer workers.")
+
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            stop.set()
+            for worker in workers:
+                worker.join()
+        self.stdout.write(self.style.SUCCESS("Transfer workers stopped."))
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rivannabank', '0004_transaction_balance_after_transaction'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(fields=['customer', 'account_type'], name='account_customer_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['account', '-date'], name='transaction_account_date_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:37
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+def open_ledger(apps, schema_editor):
+    # Seed the ledger with each existing balance so it rebuilds to today's figures
+    Account = apps.get_model('rivannabank', 'Account')
+    LedgerEntry = apps.get_model('rivannabank', 'LedgerEntry')
+    entries = []
+    for account_id, balance in Account.objects.exclude(balance=0).values_list('id', 'balance').iterator():
+        journal = uuid.uuid4()
+        entries += [
+            LedgerEntry(journal=journal, account_id=account_id, amount=balance),
+            LedgerEntry(journal=journal, external_account='opening', amount=-balance),
+        ]
+        if len(entries) >= 5000:
+            LedgerEntry.objects.bulk_create(entries)
+            entries = []
+    LedgerEntry.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rivannabank', '0005_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('journal', models.UUIDField(db_index=True, default=uuid.uuid4)),
+                ('external_account', models.CharField(blank=True, choices=[('cash', 'Cash'), ('opening', 'Opening balance')], default='', max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='rivannabank.account')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['account', 'id'], name='ledger_account_id_idx')],
+            },
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rivannabank', '0006_ledgerentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('transaction_type', models.CharField(choices=[('Deposit', 'Deposit'), ('Withdrawal', 'Withdrawal'), ('E-Transfer', 'E-Transfer')], max_length=50)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('date', models.DateTimeField()),
+                ('status', models.CharField(max_length=50)),
+                ('balance_after_transaction', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_transactions', to='rivannabank.account')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['account', '-date'], name='archived_account_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rivannabank', '0007_archivedtransaction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64)),
+                ('scope', models.CharField(max_length=20)),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('content_type', models.CharField(blank=True, default='', max_length=100)),
+                ('body', models.TextField(blank=True, default='')),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rivannabank.customer')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('customer', 'key'), name='idempotency_customer_key_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rivannabank', '0008_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fundtransfer',
+            name='status_detail',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='fundtransfer',
+            index=models.Index(fields=['status', 'id'], name='fundtransfer_status_id_idx'),
+        ),
+    ]
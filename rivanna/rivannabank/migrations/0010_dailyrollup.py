@@ -0,0 +1,29 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rivannabank', '0009_transfer_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('transaction_type', models.CharField(choices=[('Deposit', 'Deposit'), ('Withdrawal', 'Withdrawal'), ('E-Transfer', 'E-Transfer')], max_length=50)),
+                ('credits', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('debits', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='rivannabank.account')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('account', 'day', 'transaction_type'), name='rollup_account_day_type_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rivannabank', '0010_dailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationMark',
+            fields=[
+                ('account', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reconciliation_mark', serialize=False, to='rivannabank.account')),
+                ('ledger_entry_id', models.BigIntegerField(default=0)),
+                ('checked_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
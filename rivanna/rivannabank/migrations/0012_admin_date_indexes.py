@@ -0,0 +1,21 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rivannabank', '0011_reconciliationmark'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fundtransfer',
+            index=models.Index(fields=['date'], name='fundtransfer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['date'], name='transaction_date_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rivannabank', '0013_idempotency_claimed_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='archivedtransaction',
+            name='archived_account_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_account_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='archivedtransaction',
+            index=models.Index(fields=['account', '-date', '-id'], name='archived_account_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['account', '-date', '-id'], name='transaction_account_date_idx'),
+        ),
+    ]
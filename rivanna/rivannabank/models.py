@@ -1,5 +1,7 @@
 from django.db import models, transaction   
+from django.utils import timezone
 from decimal import Decimal
+import uuid
 # Create your models here.
 #Customer model represents a bank customer
 class Customer(models.Model):
@@ -18,6 +20,12 @@ class Account(models.Model):
     date_opened = models.DateTimeField(auto_now_add=True)
     customer = models.ForeignKey('Customer', on_delete=models.CASCADE)  # Assumes you have a Customer model
 
+    class Meta:
+        indexes = [
+            # deposit/checkBalance/sendMoney all look accounts up by owner and type
+            models.Index(fields=['customer', 'account_type'], name='account_customer_type_idx'),
+        ]
+
     def __str__(self):
         return f"Account {self.id} - {self.account_type}"
     
@@ -45,67 +53,173 @@ class Transaction(models.Model):
     account = models.ForeignKey('Account', on_delete=models.CASCADE)  # Links to an account
     balance_after_transaction = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)  # 👈 NEW
 
+    class Meta:
+        indexes = [
+            # Transaction history reads an account's rows newest first; id breaks date ties
+            models.Index(fields=['account', '-date', '-id'], name='transaction_account_date_idx'),
+            # The admin's list_filter=('date',) ranges filter by date alone
+            models.Index(fields=['date'], name='transaction_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.transaction_type} - {self.amount} - {self.status}"
 
     def save(self, *args, **kwargs):
-        # Use atomic transaction to ensure balance is updated safely
+        from .events import publish_transactions
+        from .services import post_cash_movement, record_rollups, signed_amount
+
+        # Use atomic transaction so the balance only moves if the row is written
         with transaction.atomic():
-            if self.transaction_type == 'Deposit':
-                self.account.balance += self.amount
-            elif self.transaction_type == 'Withdrawal':
-                if self.account.balance >= self.amount:
-                    self.account.balance -= self.amount
-                else:
-                    raise ValueError("Insufficient balance for sending money")
-
-            # Save the updated account balance
-            self.account.save()
-            self.balance_after_transaction = self.account.balance
+            adding = self._state.adding
+            if adding and self.transaction_type in ('Deposit', 'Withdrawal'):
+                delta = signed_amount(self)
+                self.balance_after_transaction = post_cash_movement(self.account_id, delta)
+                if Transaction.account.is_cached(self):
+                    self.account.balance = self.balance_after_transaction
             # Save the transaction itself
             super(Transaction, self).save(*args, **kwargs)
+            if adding:
+                record_rollups([self])
+                publish_transactions([self])
+
+
+# ArchivedTransaction holds cold Transaction rows moved out by archive_transactions.
+# Ids are kept, so (date, id) cursors stay valid across the two tables.
+class ArchivedTransaction(models.Model):
+    id = models.BigIntegerField(primary_key=True)  # Same id the row had in Transaction
+    transaction_type = models.CharField(max_length=50, choices=Transaction.TRANSACTION_TYPES)
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    date = models.DateTimeField()
+    status = models.CharField(max_length=50)
+    account = models.ForeignKey('Account', related_name='archived_transactions', on_delete=models.CASCADE)
+    balance_after_transaction = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['account', '-date', '-id'], name='archived_account_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_type} - {self.amount} - {self.status}"
 
 
 # FundTransfer model represents money transfers between accounts
 class FundTransfer(models.Model):
     amount = models.DecimalField(max_digits=15, decimal_places=2)  # Transfer amount
     date = models.DateTimeField(auto_now_add=True)  # Auto timestamp when created
-    status = models.CharField(max_length=45, default='Initiated')  # Transfer status
+    status = models.CharField(max_length=45, default='Initiated')  # Transfer status; 'Initiated' rows are queued for workers
+    status_detail = models.CharField(max_length=255, blank=True, default='')  # Why a queued transfer failed
     sender_account = models.ForeignKey('Account', related_name='sent_transfers', on_delete=models.CASCADE)  # Sender's account
     receiver_account = models.ForeignKey('Account', related_name='received_transfers', on_delete=models.CASCADE)  # Receiver's account
 
+    class Meta:
+        indexes = [
+            # Transfer workers claim the oldest queued rows
+            models.Index(fields=['status', 'id'], name='fundtransfer_status_id_idx'),
+            # The admin's list_filter=('date',) ranges and month_transfers' month scan
+            models.Index(fields=['date'], name='fundtransfer_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.sender_account.customer.full_name} -> {self.receiver_account.customer.full_name}: {self.amount}"
 
-    def save(self, *args, **kwargs):
+    def save(self, *args, process=True, **kwargs):
+        # process=False stores the transfer as 'Initiated' for run_transfer_workers
+        from .services import transfer
+
+        if not isinstance(self.amount, Decimal):
+            self.amount = Decimal(str(self.amount))
+
         # Use atomic transaction to ensure transfer is handled safely
         with transaction.atomic():
-            if not isinstance(self.amount, Decimal):
-                self.amount = Decimal(str(self.amount))
-
-        if self.sender_account.balance >= self.amount:
-            self.sender_account.balance -= self.amount
-            self.receiver_account.balance += self.amount
-
-            Transaction.objects.create(
-                transaction_type='E-Transfer',
-                amount=-self.amount,
-                account=self.sender_account,
-                status='Completed',
-                balance_after_transaction=self.sender_account.balance
-            )
-            Transaction.objects.create(
-                transaction_type='E-Transfer',
-                amount=self.amount,
-                account=self.receiver_account,
-                status='Completed',
-                balance_after_transaction=self.receiver_account.balance
-            )
-
-            self.sender_account.save()
-            self.receiver_account.save()
-
-            self.status = 'Completed'
+            if process and self._state.adding and self.status == 'Initiated':
+                sender_balance, receiver_balance = transfer(self.sender_account_id, self.receiver_account_id, self.amount)
+                if FundTransfer.sender_account.is_cached(self):
+                    self.sender_account.balance = sender_balance
+                if FundTransfer.receiver_account.is_cached(self):
+                    self.receiver_account.balance = receiver_balance
+                self.status = 'Completed'
             super(FundTransfer, self).save(*args, **kwargs)
-        else:
-            raise ValueError("Insufficient balance for fund transfer")
\ No newline at end of file
+
+
+# LedgerEntry is the append-only, double-entry record of every money movement.
+# Entries sharing a journal id always sum to zero; Account.balance is a cached
+# projection of the account's entries (see services and rebuild_balances).
+class LedgerEntry(models.Model):
+    EXTERNAL_ACCOUNTS = (
+        ('cash', 'Cash'),  # Deposits come from / withdrawals go to the outside world
+        ('opening', 'Opening balance'),  # Balances that predate the ledger
+    )
+
+    journal = models.UUIDField(default=uuid.uuid4, db_index=True)  # Groups the legs of one movement
+    account = models.ForeignKey('Account', null=True, blank=True, related_name='ledger_entries', on_delete=models.CASCADE)  # Customer account leg
+    external_account = models.CharField(max_length=20, choices=EXTERNAL_ACCOUNTS, blank=True, default='')  # Bank-side leg
+    amount = models.DecimalField(max_digits=15, decimal_places=2)  # Signed: + credits the account, - debits it
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Per-account SUMs and incremental rebuilds scan an account's entries by id
+            models.Index(fields=['account', 'id'], name='ledger_account_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.journal}: {self.account_id or self.external_account} {self.amount}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Ledger entries are append-only")
+        super(LedgerEntry, self).save(*args, **kwargs)
+
+
+# DailyRollup holds per-account, per-day, per-type totals for analytics charts.
+# Every write path upserts it alongside the Transaction rows it creates;
+# manage.py rebuild_rollups recomputes it from the hot and archive tables.
+class DailyRollup(models.Model):
+    account = models.ForeignKey('Account', related_name='daily_rollups', on_delete=models.CASCADE)
+    day = models.DateField()  # Transaction date in the site time zone
+    transaction_type = models.CharField(max_length=50, choices=Transaction.TRANSACTION_TYPES)
+    credits = models.DecimalField(max_digits=15, decimal_places=2, default=0)  # Sum of positive amounts (income)
+    debits = models.DecimalField(max_digits=15, decimal_places=2, default=0)  # Sum of negative amounts (spending), stored negative
+    transaction_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index analytics reads through: an account's days in order
+            models.UniqueConstraint(fields=['account', 'day', 'transaction_type'], name='rollup_account_day_type_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.account_id} {self.day} {self.transaction_type}: +{self.credits} {self.debits}"
+
+
+# ReconciliationMark is manage.py reconcile's per-account high-water mark: the
+# last ledger entry seen when the account last reconciled cleanly.
+class ReconciliationMark(models.Model):
+    account = models.OneToOneField('Account', primary_key=True, related_name='reconciliation_mark', on_delete=models.CASCADE)
+    ledger_entry_id = models.BigIntegerField(default=0)  # Accounts with newer entries are due for a re-check
+    checked_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.account_id} @ {self.ledger_entry_id}"
+
+
+# IdempotencyKey remembers the outcome of a deposit/transfer POST so a client
+# retry carrying the same key gets the stored response instead of re-posting.
+class IdempotencyKey(models.Model):
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
+    key = models.CharField(max_length=64)  # Idempotency-Key header or hidden form token
+    scope = models.CharField(max_length=20)  # Which view the key was used with
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)  # Null while the first attempt is running
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    body = models.TextField(blank=True, default='')
+    claimed_at = models.DateTimeField(default=timezone.now)  # When the running attempt took the key
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'key'], name='idempotency_customer_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key}"
@@ -0,0 +1,40 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.db import connections
+from django.db.models import Max, Min
+
+
+def id_ranges(model, size):
+    """Half-open id ranges [low, high) of `size` ids covering every row of `model`.
+
+    Ranges are aligned to multiples of size, so a given size always yields
+    the same ranges, however many rows were added since the last run.
+    """
+    bounds = model.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return []
+    first = bounds['low'] - bounds['low'] % size
+    return [(low, low + size) for low in range(first, bounds['high'] + 1, size)]
+
+
+def close_connections_before_fork():
+    # Children must open their own connections rather than share the parent's sockets
+    connections.close_all()
+
+
+def run_partitioned(func, tasks, processes):
+    """Yield func(*task) for every task, across a process pool when processes > 1.
+
+    Pool results arrive in completion order, so func should return enough
+    (e.g. its id range) for the caller to report on each one.
+    """
+    if processes <= 1:
+        for task in tasks:
+            yield func(*task)
+        return
+    close_connections_before_fork()
+    with ProcessPoolExecutor(max_workers=processes, initializer=django.setup) as pool:
+        futures = [pool.submit(func, *task) for task in tasks]
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,93 @@
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+# Reads only go to a replica while this is set, i.e. inside a safe-method
+# request that is not pinned. Management commands, workers and every
+# POST read from the primary.
+_use_replica = ContextVar('use_replica', default=False)
+
+# Always read from the primary: a session written a moment ago must be
+# found on the very next request, before it reaches a replica.
+PRIMARY_ONLY_APPS = {'sessions', 'contenttypes', 'auth'}
+
+
+class PrimaryReplicaRouter:
+    """Send writes to 'default' and eligible reads to one of REPLICA_DATABASES."""
+
+    def db_for_read(self, model, **hints):
+        if not settings.REPLICA_DATABASES or not _use_replica.get() or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return 'default'
+        return random.choice(settings.REPLICA_DATABASES)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Let safe requests read from replicas, except right after the client wrote.
+
+    An unsafe request (POST, PUT, PATCH, DELETE) reads from the primary and
+    sets a cookie that pins the client to the primary for
+    REPLICA_PIN_SECONDS, so a user sees their own deposit even while the
+    replicas lag.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _use_replica.set(self.replica_allowed(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        token = _use_replica.set(self.replica_allowed(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        return self.finish(request, response)
+
+    def replica_allowed(self, request):
+        return request.method in ('GET', 'HEAD', 'OPTIONS') and settings.REPLICA_PIN_COOKIE not in request.COOKIES
+
+    def finish(self, request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and settings.REPLICA_DATABASES:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+            )
+        elif response.streaming and not response.is_async and self.replica_allowed(request):
+            # Streamed bodies (statement export) query after the view returns
+            response.streaming_content = replica_reads(response.streaming_content)
+        return response
+
+
+def replica_reads(iterator):
+    token = _use_replica.set(True)
+    try:
+        yield from iterator
+    finally:
+        _use_replica.reset(token)
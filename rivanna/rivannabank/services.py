@@ -0,0 +1,689 @@
+import csv
+import io
+import json
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Case, CharField, Count, DecimalField, F, Max, Min, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .caching import recipient_cache
+from .events import publish_balances, publish_transactions
+from .models import Customer, Account, Login, Transaction, ArchivedTransaction, FundTransfer, LedgerEntry, DailyRollup, ReconciliationMark
+
+
+class InsufficientFunds(ValueError):
+    pass
+
+
+def lock_accounts(account_ids):
+    """Row-lock the given accounts in ascending id order.
+
+    Every write path locks in the same order, so two transfers touching the
+    same pair of accounts queue up instead of deadlocking. A range(start, stop)
+    locks a whole id range with one index range scan. Backends without
+    SELECT ... FOR UPDATE (SQLite) already serialise writers.
+    """
+    if isinstance(account_ids, range):
+        accounts = Account.objects.filter(id__gte=account_ids.start, id__lt=account_ids.stop)
+    else:
+        account_ids = sorted(set(account_ids))
+        accounts = Account.objects.filter(id__in=account_ids)
+    if connection.features.has_select_for_update:
+        list(accounts.select_for_update().order_by('id').values_list('id', flat=True))
+    return account_ids
+
+
+def apply_balance_change(account_id, delta):
+    """Atomically add `delta` to an account's balance and return the new balance.
+
+    The arithmetic happens in the UPDATE itself, and debits only match the
+    row while the balance still covers them, so concurrent writers can never
+    lose an update or overdraw the account.
+    """
+    delta = Decimal(delta)
+    accounts = Account.objects.filter(id=account_id)
+    if delta < 0:
+        accounts = accounts.filter(balance__gte=-delta)
+    # No savepoint: a failure here must abort the caller's transaction anyway
+    with transaction.atomic(savepoint=False):
+        if not accounts.update(balance=F('balance') + delta):
+            if Account.objects.filter(id=account_id).exists():
+                raise InsufficientFunds("Insufficient balance for this transaction")
+            raise Account.DoesNotExist(f"Account {account_id} does not exist")
+        return Account.objects.values_list('balance', flat=True).get(id=account_id)
+
+
+def journal_entries(*legs):
+    """Build the LedgerEntry rows for one balanced movement.
+
+    Each leg is (account_id, amount) for a customer account or
+    (external_account, amount) for the bank side, e.g. ('cash', -amount).
+    """
+    journal = uuid.uuid4()
+    if sum(amount for _, amount in legs) != 0:
+        raise ValueError("Ledger journal does not balance")
+    return [
+        LedgerEntry(journal=journal, external_account=leg, amount=amount)
+        if isinstance(leg, str) else
+        LedgerEntry(journal=journal, account_id=leg, amount=amount)
+        for leg, amount in legs
+    ]
+
+
+def post_cash_movement(account_id, delta):
+    """Move money between an account and the outside world (deposit/withdrawal).
+
+    Appends the balanced ledger journal and updates the cached balance in the
+    same transaction. Returns the new balance.
+    """
+    delta = Decimal(delta)
+    with transaction.atomic(savepoint=False):
+        balance = apply_balance_change(account_id, delta)
+        LedgerEntry.objects.bulk_create(journal_entries((account_id, delta), ('cash', -delta)))
+    return balance
+
+
+def record_rollups(transactions):
+    """Add new Transaction rows to the DailyRollup totals with one upsert.
+
+    Runs inside the caller's transaction, so the rollups commit or roll
+    back with the rows they count. Concurrent writers to the same
+    account-day serialise on the unique key instead of losing increments.
+    """
+    totals = {}
+    for tx in transactions:
+        key = (tx.account_id, timezone.localdate(tx.date), tx.transaction_type)
+        credits, debits, count = totals.get(key, (Decimal('0.00'), Decimal('0.00'), 0))
+        amount = signed_amount(tx)
+        if amount > 0:
+            credits += amount
+        else:
+            debits += amount
+        totals[key] = (credits, debits, count + 1)
+    if not totals:
+        return
+
+    ops = connection.ops
+    params = []
+    for (account_id, day, transaction_type), (credits, debits, count) in totals.items():
+        params += [
+            account_id, ops.adapt_datefield_value(day), transaction_type,
+            ops.adapt_decimalfield_value(credits, 15, 2), ops.adapt_decimalfield_value(debits, 15, 2), count,
+        ]
+    table = DailyRollup._meta.db_table
+    if connection.vendor == 'mysql':
+        conflict = """ON DUPLICATE KEY UPDATE credits = credits + VALUES(credits), debits = debits + VALUES(debits),
+            transaction_count = transaction_count + VALUES(transaction_count)"""
+    else:
+        conflict = f"""ON CONFLICT (account_id, day, transaction_type) DO UPDATE SET
+            credits = {table}.credits + excluded.credits, debits = {table}.debits + excluded.debits,
+            transaction_count = {table}.transaction_count + excluded.transaction_count"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {table} (account_id, day, transaction_type, credits, debits, transaction_count)
+            VALUES {", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(totals))}
+            {conflict}
+        """, params)
+
+
+def post_transaction(account_id, transaction_type, amount, status='Completed'):
+    """Record a Deposit or Withdrawal and move the balance with it."""
+    tx = Transaction(transaction_type=transaction_type, amount=Decimal(amount), status=status, account_id=account_id)
+    tx.save()
+    return tx
+
+
+def deposit(account_id, amount):
+    amount = Decimal(amount)
+    if amount <= 0:
+        raise ValueError("Deposit amount must be greater than zero.")
+    return post_transaction(account_id, 'Deposit', amount)
+
+
+def resolve_recipient_account(email):
+    """Return the id of the chequing account that e-transfers to `email` land in.
+
+    Hits are served from the in-process recipient cache. A miss costs one
+    joined query, plus one more only when the lookup fails, to tell an
+    unknown email from a customer without a chequing account.
+    """
+    cached = recipient_cache.get(email)
+    if cached is not None:
+        return cached[0]
+
+    row = (
+        Account.objects.filter(customer__email=email, account_type='chequing')
+        .values_list('id', 'customer_id')
+        .first()
+    )
+    if row is None:
+        if Customer.objects.filter(email=email).exists():
+            raise Account.DoesNotExist("Recipient does not have a chequing account.")
+        raise Customer.DoesNotExist("Recipient email not registered.")
+    recipient_cache.set(email, row)
+    return row[0]
+
+
+def transfer(sender_account_id, receiver_account_id, amount):
+    """Move `amount` between two accounts and write both E-Transfer ledger rows.
+
+    Returns the (sender, receiver) balances after the transfer.
+    """
+    amount = Decimal(amount)
+    if amount <= 0:
+        raise ValueError("Transfer amount must be greater than zero.")
+    if sender_account_id == receiver_account_id:
+        raise ValueError("Cannot transfer to the same account.")
+
+    with transaction.atomic():
+        lock_accounts([sender_account_id, receiver_account_id])
+        try:
+            sender_balance = apply_balance_change(sender_account_id, -amount)
+        except InsufficientFunds:
+            raise InsufficientFunds("Insufficient balance for fund transfer")
+        receiver_balance = apply_balance_change(receiver_account_id, amount)
+
+        LedgerEntry.objects.bulk_create(journal_entries((sender_account_id, -amount), (receiver_account_id, amount)))
+        transactions = Transaction.objects.bulk_create([
+            Transaction(
+                transaction_type='E-Transfer',
+                amount=-amount,
+                account_id=sender_account_id,
+                status='Completed',
+                balance_after_transaction=sender_balance,
+            ),
+            Transaction(
+                transaction_type='E-Transfer',
+                amount=amount,
+                account_id=receiver_account_id,
+                status='Completed',
+                balance_after_transaction=receiver_balance,
+            ),
+        ])
+        record_rollups(transactions)
+        publish_transactions(transactions)
+    return sender_balance, receiver_balance
+
+
+ONBOARDING_CONFLICT_ERRORS = {
+    'email': "Email is already registered.",
+    'phone': "Phone number is already registered.",
+    'username': "Username is already taken.",
+}
+DEFAULT_ACCOUNT_TYPES = ('Savings', 'Chequing')
+
+
+def onboarding_conflicts(email, phone, username):
+    """Return form errors for an email, phone or username that is already taken, in one query."""
+    taken = Customer.objects.filter(email=email).values_list(Value('email', output_field=CharField())).union(
+        Customer.objects.filter(phone=phone).values_list(Value('phone', output_field=CharField())),
+        Login.objects.filter(username=username).values_list(Value('username', output_field=CharField())),
+        all=True,
+    )
+    return {field: ONBOARDING_CONFLICT_ERRORS[field] for (field,) in taken}
+
+
+def onboard_customer(full_name, phone, email, address, username, password):
+    """Create a customer with their login and Savings/Chequing accounts atomically."""
+    with transaction.atomic():
+        customer = Customer.objects.create(full_name=full_name, phone=phone, email=email, address=address)
+        Login.objects.create(username=username, password_hash=make_password(password), customer=customer)
+        Account.objects.bulk_create([
+            Account(account_type=account_type, balance=Decimal('0.00'), customer=customer)
+            for account_type in DEFAULT_ACCOUNT_TYPES
+        ])
+    return customer
+
+
+def import_customers(rows):
+    """Onboard a chunk of customer rows with one bulk insert per table.
+
+    Each row needs full_name, phone, email and username, plus either a
+    Django password_hash or a plain password. Rows without either get an
+    unusable password and must reset it. Rows that clash with existing
+    customers, or with earlier rows in the chunk, are skipped, so re-running
+    an interrupted import is safe. Returns (created, skipped), where skipped
+    holds (row, reason) pairs.
+    """
+    emails = {row.get('email') for row in rows}
+    phones = {row.get('phone') for row in rows}
+    usernames = {row.get('username') for row in rows}
+    taken_emails = set(Customer.objects.filter(email__in=emails).values_list('email', flat=True))
+    taken_phones = set(Customer.objects.filter(phone__in=phones).values_list('phone', flat=True))
+    taken_usernames = set(Login.objects.filter(username__in=usernames).values_list('username', flat=True))
+
+    accepted, skipped = [], []
+    for row in rows:
+        if not all(row.get(field) for field in ('full_name', 'phone', 'email', 'username')):
+            skipped.append((row, "missing required field"))
+        elif row['email'] in taken_emails:
+            skipped.append((row, "email already registered"))
+        elif row['phone'] in taken_phones:
+            skipped.append((row, "phone already registered"))
+        elif row['username'] in taken_usernames:
+            skipped.append((row, "username already taken"))
+        else:
+            accepted.append(row)
+            taken_emails.add(row['email'])
+            taken_phones.add(row['phone'])
+            taken_usernames.add(row['username'])
+
+    if not accepted:
+        return 0, skipped
+
+    with transaction.atomic():
+        Customer.objects.bulk_create([
+            Customer(full_name=row['full_name'], phone=row['phone'], email=row['email'], address=row.get('address') or None)
+            for row in accepted
+        ])
+        # MySQL does not hand back bulk-inserted ids, so map them by email
+        customer_ids = dict(Customer.objects.filter(email__in=[row['email'] for row in accepted]).values_list('email', 'id'))
+        Login.objects.bulk_create([
+            Login(
+                username=row['username'],
+                password_hash=row.get('password_hash') or make_password(row.get('password') or None),
+                customer_id=customer_ids[row['email']],
+            )
+            for row in accepted
+        ])
+        Account.objects.bulk_create([
+            Account(account_type=account_type, balance=Decimal('0.00'), customer_id=customer_ids[row['email']])
+            for row in accepted
+            for account_type in DEFAULT_ACCOUNT_TYPES
+        ])
+    return len(accepted), skipped
+
+
+BATCH_UPDATE_SIZE = 500
+
+
+def transfer_rows(items):
+    return [{'email': item.get('email'), 'amount': item.get('amount')} for item in items]
+
+
+def read_transfer_rows(data, fmt):
+    """Parse a CSV (email,amount header) or JSON list of transfers into dicts."""
+    if fmt == 'json':
+        items = json.loads(data)
+        if isinstance(items, dict):
+            items = items.get('transfers', [])
+        return transfer_rows(items)
+    if fmt == 'csv':
+        return transfer_rows(csv.DictReader(io.StringIO(data)))
+    raise ValueError(f"Unsupported transfer file format: {fmt}")
+
+
+def batch_transfer(sender_account_id, rows):
+    """Send many e-transfers from one account in a single database transaction.
+
+    Recipients are resolved with one query, every involved account is locked
+    in id order, and the FundTransfer and ledger rows are bulk inserted.
+    Returns one result dict per input row, in input order.
+    """
+    results = []
+    for index, row in enumerate(rows):
+        result = {'row': index + 1, 'email': (row.get('email') or '').strip(), 'amount': None, 'status': 'Failed', 'error': None, 'balance_after': None}
+        try:
+            amount = Decimal(str(row.get('amount')))
+            if amount <= 0 or amount != amount.quantize(Decimal('0.01')):
+                raise InvalidOperation
+            result['amount'] = amount
+        except (InvalidOperation, TypeError):
+            result['error'] = "Invalid amount."
+        if not result['email']:
+            result['error'] = result['error'] or "Missing recipient email."
+        results.append(result)
+
+    emails = {result['email'] for result in results if not result['error']}
+    recipients = dict(
+        Account.objects.filter(customer__email__in=emails, account_type='chequing')
+        .values_list('customer__email', 'id')
+    )
+
+    with transaction.atomic():
+        account_ids = lock_accounts([sender_account_id, *recipients.values()])
+        balances = dict(Account.objects.filter(id__in=account_ids).values_list('id', 'balance'))
+        if sender_account_id not in balances:
+            raise Account.DoesNotExist(f"Account {sender_account_id} does not exist")
+
+        transfers, ledger, journals, credits = [], [], [], {}
+        for result in results:
+            if result['error']:
+                continue
+            receiver_account_id = recipients.get(result['email'])
+            amount = result['amount']
+            if receiver_account_id is None:
+                result['error'] = "Recipient email not registered or has no chequing account."
+                continue
+            if receiver_account_id == sender_account_id:
+                result['error'] = "Cannot transfer to the same account."
+                continue
+            if balances[sender_account_id] < amount:
+                result['error'] = "Insufficient balance for fund transfer."
+                continue
+
+            balances[sender_account_id] -= amount
+            balances[receiver_account_id] += amount
+            credits[receiver_account_id] = credits.get(receiver_account_id, Decimal('0.00')) + amount
+            transfers.append(FundTransfer(
+                amount=amount,
+                status='Completed',
+                sender_account_id=sender_account_id,
+                receiver_account_id=receiver_account_id,
+            ))
+            journals += journal_entries((sender_account_id, -amount), (receiver_account_id, amount))
+            ledger += [
+                Transaction(
+                    transaction_type='E-Transfer',
+                    amount=-amount,
+                    account_id=sender_account_id,
+                    status='Completed',
+                    balance_after_transaction=balances[sender_account_id],
+                ),
+                Transaction(
+                    transaction_type='E-Transfer',
+                    amount=amount,
+                    account_id=receiver_account_id,
+                    status='Completed',
+                    balance_after_transaction=balances[receiver_account_id],
+                ),
+            ]
+            result['status'] = 'Completed'
+            result['balance_after'] = balances[sender_account_id]
+
+        if transfers:
+            apply_balance_change(sender_account_id, -sum(transfer.amount for transfer in transfers))
+            credited = list(credits.items())
+            for start in range(0, len(credited), BATCH_UPDATE_SIZE):
+                chunk = credited[start:start + BATCH_UPDATE_SIZE]
+                Account.objects.filter(id__in=[account_id for account_id, _ in chunk]).update(
+                    balance=F('balance') + Case(
+                        *(When(id=account_id, then=Value(amount)) for account_id, amount in chunk),
+                        output_field=DecimalField(max_digits=15, decimal_places=2),
+                    )
+                )
+            FundTransfer.objects.bulk_create(transfers)
+            Transaction.objects.bulk_create(ledger)
+            record_rollups(ledger)
+            publish_transactions(ledger)
+            LedgerEntry.objects.bulk_create(journals)
+
+    return results
+
+
+def enqueue_transfer(sender_account_id, receiver_account_id, amount):
+    """Queue an e-transfer for run_transfer_workers and return the FundTransfer.
+
+    Only the cheap checks run here; the balance is checked again, under
+    lock, when a worker settles the transfer.
+    """
+    amount = Decimal(amount)
+    if amount <= 0:
+        raise ValueError("Transfer amount must be greater than zero.")
+    if sender_account_id == receiver_account_id:
+        raise ValueError("Cannot transfer to the same account.")
+    fund_transfer = FundTransfer(amount=amount, sender_account_id=sender_account_id, receiver_account_id=receiver_account_id)
+    fund_transfer.save(process=False)
+    return fund_transfer
+
+
+def claim_queued_transfers(limit):
+    """Lock and return up to `limit` of the oldest queued transfers.
+
+    Must run inside a transaction. Rows another worker already holds are
+    skipped (SELECT ... FOR UPDATE SKIP LOCKED) so workers never wait on
+    each other; backends without it fall back to a plain read and rely on
+    the status guard in process_transfer_queue.
+    """
+    jobs = FundTransfer.objects.filter(status='Initiated').order_by('id')
+    if connection.features.has_select_for_update_skip_locked:
+        jobs = jobs.select_for_update(skip_locked=True)
+    return list(jobs[:limit])
+
+
+def process_transfer_queue(batch_size=100):
+    """Settle one batch of queued transfers and return {'Completed': n, 'Failed': n}.
+
+    The batch is grouped by sender so each account's transfers apply in
+    queue order, and every involved account is locked once, in id order,
+    for the whole batch. Each transfer runs in its own savepoint: a failed
+    one is marked 'Failed' with the reason while the rest still commit.
+    """
+    counts = {'Completed': 0, 'Failed': 0}
+    with transaction.atomic():
+        jobs = claim_queued_transfers(batch_size)
+        if not jobs:
+            return counts
+        lock_accounts([account_id for job in jobs for account_id in (job.sender_account_id, job.receiver_account_id)])
+
+        for job in sorted(jobs, key=lambda job: (job.sender_account_id, job.id)):
+            try:
+                with transaction.atomic():
+                    # Guards against a second worker on backends without SKIP LOCKED
+                    if not FundTransfer.objects.filter(id=job.id, status='Initiated').update(status='Completed'):
+                        continue
+                    transfer(job.sender_account_id, job.receiver_account_id, job.amount)
+            except (ValueError, Account.DoesNotExist) as e:
+                FundTransfer.objects.filter(id=job.id, status='Initiated').update(status='Failed', status_detail=str(e)[:255])
+                counts['Failed'] += 1
+            else:
+                counts['Completed'] += 1
+    return counts
+
+
+def ledger_balances(start_id, end_id):
+    """Sum the ledger per account for account ids in [start_id, end_id) with one GROUP BY."""
+    return dict(
+        LedgerEntry.objects.filter(account_id__gte=start_id, account_id__lt=end_id)
+        .values('account_id')
+        .annotate(total=Sum('amount'))
+        .values_list('account_id', 'total')
+    )
+
+
+def rebuild_balances(start_id, end_id, apply=True):
+    """Recompute the cached balances of one id range from the ledger.
+
+    Returns {account_id: (cached, ledger)} for every account that had
+    drifted. With apply=True the drifted accounts are reset to the ledger
+    figure. The range is locked first, so no posting can land between the
+    SUM and the write.
+    """
+    with transaction.atomic():
+        if apply:
+            lock_accounts(range(start_id, end_id))
+        totals = ledger_balances(start_id, end_id)
+        drift = {
+            account_id: (cached, totals.get(account_id, Decimal('0.00')))
+            for account_id, cached in Account.objects.filter(id__gte=start_id, id__lt=end_id).values_list('id', 'balance')
+            if cached != totals.get(account_id, Decimal('0.00'))
+        }
+        if apply:
+            items = list(drift.items())
+            for start in range(0, len(items), BATCH_UPDATE_SIZE):
+                chunk = items[start:start + BATCH_UPDATE_SIZE]
+                Account.objects.filter(id__in=[account_id for account_id, _ in chunk]).update(
+                    balance=Case(
+                        *(When(id=account_id, then=Value(ledger)) for account_id, (_, ledger) in chunk),
+                        output_field=DecimalField(max_digits=15, decimal_places=2),
+                    )
+                )
+            publish_balances({account_id: ledger for account_id, (_, ledger) in drift.items()})
+    return drift
+
+
+def unbalanced_journals(since_id=0):
+    """Journals touched by entries after since_id whose legs do not sum to zero."""
+    recent = LedgerEntry.objects.filter(id__gt=since_id).values('journal')
+    return list(
+        LedgerEntry.objects.filter(journal__in=recent)
+        .values('journal')
+        .annotate(total=Sum('amount'))
+        .exclude(total=0)
+        .values_list('journal', flat=True)
+    )
+
+
+def signed_amount(tx=None):
+    """A transaction's amount with its sign, or the same as an ORM expression when tx is None.
+
+    Withdrawals store a positive amount; the type carries the sign.
+    """
+    if tx is not None:
+        return -tx.amount if tx.transaction_type == 'Withdrawal' else tx.amount
+    return Case(When(transaction_type='Withdrawal', then=-F('amount')), default=F('amount'))
+
+
+def reconcile_range(start_id, end_id, full=False):
+    """Cross-check the cached balances of one account id range.
+
+    Only accounts with ledger entries past their ReconciliationMark (or
+    every account, with full=True) are checked, each of them three ways:
+
+    - 'ledger': against the sum of the account's ledger entries;
+    - 'transactions': against the opening-balance journal plus the signed
+      Transaction amounts (hot and archive) dated after the ledger cutover;
+    - 'last_balance': against the newest known balance_after_transaction.
+
+    Every figure is one GROUP BY (or correlated subquery) over the whole
+    set, taken while the accounts are locked so writers cannot interleave.
+    Clean accounts get their mark advanced; discrepant ones lose it and
+    stay due until they reconcile.
+    Returns (accounts_checked, [(account_id, check, cached, expected)]).
+    """
+    with transaction.atomic():
+        last_entries = dict(
+            LedgerEntry.objects.filter(account_id__gte=start_id, account_id__lt=end_id)
+            .values('account_id').annotate(last=Max('id')).values_list('account_id', 'last')
+        )
+        marks = dict(ReconciliationMark.objects.filter(account_id__gte=start_id, account_id__lt=end_id).values_list('account_id', 'ledger_entry_id'))
+        due = [
+            account_id
+            for account_id in Account.objects.filter(id__gte=start_id, id__lt=end_id).values_list('id', flat=True)
+            if full or account_id not in marks or last_entries.get(account_id, 0) > marks[account_id]
+        ]
+        if not due:
+            return 0, []
+        lock_accounts(due)
+
+        cached = dict(Account.objects.filter(id__in=due).values_list('id', 'balance'))
+        ledger = dict(
+            LedgerEntry.objects.filter(account_id__in=due)
+            .values('account_id').annotate(total=Sum('amount')).values_list('account_id', 'total')
+        )
+        openings = LedgerEntry.objects.filter(external_account='opening')
+        opening = dict(
+            LedgerEntry.objects.filter(account_id__in=due, journal__in=openings.values('journal'))
+            .values('account_id').annotate(total=Sum('amount')).values_list('account_id', 'total')
+        )
+        # Rows before the cutover are already inside the opening balances
+        cutover = openings.aggregate(at=Min('created_at'))['at']
+        expected = dict(opening)
+        latest = {}
+        for model in (ArchivedTransaction, Transaction):
+            rows = model.objects.filter(account_id__in=due)
+            if cutover is not None:
+                rows = rows.filter(date__gte=cutover)
+            for account_id, total in rows.values('account_id').annotate(total=Sum(signed_amount())).values_list('account_id', 'total'):
+                expected[account_id] = expected.get(account_id, Decimal('0.00')) + total
+            # Hot rows are newer than archived ones, so they win
+            newest = model.objects.filter(account=OuterRef('pk'), balance_after_transaction__isnull=False).order_by('-date', '-id')
+            latest.update(
+                (account_id, balance)
+                for account_id, balance in Account.objects.filter(id__in=due)
+                .annotate(last_balance=Subquery(newest.values('balance_after_transaction')[:1]))
+                .values_list('id', 'last_balance')
+                if balance is not None
+            )
+
+        discrepancies = []
+        for account_id in due:
+            balance = cached[account_id]
+            checks = (
+                ('ledger', ledger.get(account_id, Decimal('0.00'))),
+                ('transactions', expected.get(account_id, Decimal('0.00'))),
+                ('last_balance', latest.get(account_id, balance)),
+            )
+            discrepancies += [(account_id, check, balance, figure.quantize(Decimal('0.01'))) for check, figure in checks if figure != balance]
+
+        failed = {account_id for account_id, *_ in discrepancies}
+        ReconciliationMark.objects.filter(account_id__in=failed).delete()
+        ReconciliationMark.objects.bulk_create(
+            [
+                ReconciliationMark(account_id=account_id, ledger_entry_id=last_entries.get(account_id, 0))
+                for account_id in due if account_id not in failed
+            ],
+            update_conflicts=True, unique_fields=['account'], update_fields=['ledger_entry_id', 'checked_at'],
+            batch_size=BATCH_UPDATE_SIZE,
+        )
+    return len(due), discrepancies
+
+
+def rollup_totals(model, start_id, end_id):
+    """GROUP BY (account, day, type) over one table for account ids in [start_id, end_id)."""
+    return (
+        model.objects.filter(account_id__gte=start_id, account_id__lt=end_id)
+        .annotate(
+            day=TruncDate('date'),
+            signed_amount=signed_amount(),
+        )
+        .values('account_id', 'day', 'transaction_type')
+        .annotate(
+            credits=Sum('signed_amount', filter=Q(signed_amount__gt=0), default=Decimal('0.00')),
+            debits=Sum('signed_amount', filter=Q(signed_amount__lte=0), default=Decimal('0.00')),
+            transaction_count=Count('id'),
+        )
+        .order_by()
+    )
+
+
+def rebuild_rollups(start_id, end_id):
+    """Recompute the DailyRollup rows of one account id range from both tables.
+
+    The accounts are locked first, so no posting can add to a rollup
+    between the delete and the insert. Returns the number of rollup rows.
+    """
+    with transaction.atomic():
+        lock_accounts(range(start_id, end_id))
+        totals = {}
+        # A day can span the archive cutoff, so the two tables' groups are merged
+        for model in (ArchivedTransaction, Transaction):
+            for row in rollup_totals(model, start_id, end_id):
+                key = (row['account_id'], row['day'], row['transaction_type'])
+                credits, debits, count = totals.get(key, (Decimal('0.00'), Decimal('0.00'), 0))
+                totals[key] = (credits + row['credits'], debits + row['debits'], count + row['transaction_count'])
+        DailyRollup.objects.filter(account_id__gte=start_id, account_id__lt=end_id).delete()
+        DailyRollup.objects.bulk_create([
+            DailyRollup(account_id=account_id, day=day, transaction_type=transaction_type, credits=credits, debits=debits, transaction_count=count)
+            for (account_id, day, transaction_type), (credits, debits, count) in totals.items()
+        ], batch_size=BATCH_UPDATE_SIZE)
+    return len(totals)
+
+
+ARCHIVE_FIELDS = ['id', 'transaction_type', 'amount', 'date', 'status', 'account_id', 'balance_after_transaction']
+
+
+def archive_transaction_batch(cutoff, after_id=0, batch_size=5000):
+    """Move the Transaction rows older than `cutoff` among the next `batch_size` ids.
+
+    Walks the primary key rather than filtering on date, so every batch is
+    a short index range scan. Returns (archived, last_id_seen); last_id_seen
+    is None once the hot table has nothing left past `after_id`. Each batch
+    commits on its own and re-copying is ignored, so an interrupted run can
+    simply be restarted.
+    """
+    with transaction.atomic():
+        rows = list(
+            Transaction.objects.filter(id__gt=after_id).order_by('id').values(*ARCHIVE_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return 0, None
+        cold = [row for row in rows if row['date'] < cutoff]
+        if cold:
+            ArchivedTransaction.objects.bulk_create([ArchivedTransaction(**row) for row in cold], ignore_conflicts=True)
+            Transaction.objects.filter(id__in=[row['id'] for row in cold]).delete()
+    return len(cold), rows[-1]['id']
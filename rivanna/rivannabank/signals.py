@@ -0,0 +1,27 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import recipient_cache
+from .context import invalidate_customer_context
+from .models import Customer, Account
+
+
+def invalidate_customer_caches(customer_id):
+    # Entries are matched on customer id, not email, so email changes are covered too
+    recipient_cache.delete_where(lambda value: value[1] == customer_id)
+    invalidate_customer_context(customer_id)
+
+
+# Invalidate once the change is visible: dropping an entry mid-transaction lets
+# another request re-cache the old committed row until the TTL runs out
+@receiver([post_save, post_delete], sender=Customer)
+def invalidate_customer_recipient(sender, instance, **kwargs):
+    customer_id = instance.id
+    transaction.on_commit(lambda: invalidate_customer_caches(customer_id))
+
+
+@receiver([post_save, post_delete], sender=Account)
+def invalidate_account_recipient(sender, instance, **kwargs):
+    customer_id = instance.customer_id
+    transaction.on_commit(lambda: invalidate_customer_caches(customer_id))
@@ -0,0 +1,168 @@
+import csv
+import heapq
+import json
+import os
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
+
+from django.db.models import Sum
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Customer, Account, Transaction, ArchivedTransaction, FundTransfer, LedgerEntry
+from .parallel import id_ranges
+
+STATEMENT_FIELDS = ['id', 'date', 'account_id', 'account__account_type', 'transaction_type', 'amount', 'status', 'balance_after_transaction']
+STATEMENT_HEADER = ['id', 'date', 'account_id', 'account_type', 'transaction_type', 'amount', 'status', 'balance_after_transaction']
+STATEMENT_FORMATS = ('html', 'csv')
+ITERATOR_CHUNK_SIZE = 2000
+
+
+def month_range(month):
+    """'YYYY-MM' -> the month's [start, end) as aware datetimes."""
+    start = datetime.strptime(month, '%Y-%m')
+    end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return timezone.make_aware(start), timezone.make_aware(end)
+
+
+def partitions(partition_size):
+    """Customer id ranges [low, high) aligned to partition_size.
+
+    Alignment keeps the ranges identical between runs, which is what lets
+    the per-partition checkpoints be reused by a resumed run.
+    """
+    return id_ranges(Customer, partition_size)
+
+
+def checkpoint_path(month_dir, low, high):
+    return os.path.join(month_dir, '.done', f"{low}-{high}")
+
+
+def pin_partition_size(month_dir, partition_size):
+    """Record the partition size month_dir's checkpoints are named for.
+
+    A checkpoint only matches a partition of the same size, so resuming
+    with another size would silently redo or skip customers. Returns the
+    size an earlier run recorded when it differs from partition_size,
+    otherwise None.
+    """
+    path = os.path.join(month_dir, '.done', 'partition-size')
+    try:
+        with open(path) as f:
+            recorded = int(f.read())
+    except FileNotFoundError:
+        write_atomically(path, str(partition_size))
+        return None
+    return recorded if recorded != partition_size else None
+
+
+def month_transactions(low, high, start, end):
+    """Stream the month's rows for customers in [low, high) from both tables.
+
+    Yields (customer_id, *STATEMENT_FIELDS) in (customer, account, date, id)
+    order. Each table is read with iterator(); the two sorted streams are
+    merged lazily, so a month that straddles the archive cutoff still comes
+    out in order. MySQL drivers buffer each result set client-side, which
+    is why partitions are kept small.
+    """
+    streams = [
+        model.objects.filter(
+            account__customer_id__gte=low, account__customer_id__lt=high, date__gte=start, date__lt=end,
+        )
+        .order_by('account__customer_id', 'account_id', 'date', 'id')
+        .values_list('account__customer_id', *STATEMENT_FIELDS)
+        .iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+        for model in (ArchivedTransaction, Transaction)
+    ]
+    return heapq.merge(*streams, key=lambda row: (row[0], row[3], row[2], row[1]))
+
+
+def ledger_totals(low, high, before):
+    """Every account's ledger balance as of `before`, for customers in [low, high)."""
+    return dict(
+        LedgerEntry.objects.filter(account__customer_id__gte=low, account__customer_id__lt=high, created_at__lt=before)
+        .values('account_id')
+        .annotate(total=Sum('amount'))
+        .values_list('account_id', 'total')
+    )
+
+
+def month_transfers(low, high, start, end):
+    """{customer_id: [transfer dicts]} for e-transfers sent or received in the month."""
+    transfers = defaultdict(list)
+    month = FundTransfer.objects.filter(date__gte=start, date__lt=end)
+    sent = month.filter(sender_account__customer_id__gte=low, sender_account__customer_id__lt=high).values_list(
+        'sender_account__customer_id', 'date', 'receiver_account__customer__email', 'amount', 'status',
+    )
+    # Queued or failed transfers never reached the recipient
+    received = month.filter(
+        receiver_account__customer_id__gte=low, receiver_account__customer_id__lt=high, status='Completed',
+    ).values_list('receiver_account__customer_id', 'date', 'sender_account__customer__email', 'amount', 'status')
+    for direction, rows in (('Sent', sent), ('Received', received)):
+        for customer_id, date, counterparty, amount, status in rows.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+            transfers[customer_id].append({
+                'date': date, 'direction': direction, 'counterparty': counterparty, 'amount': amount, 'status': status,
+            })
+    for customer_transfers in transfers.values():
+        customer_transfers.sort(key=itemgetter('date'))
+    return transfers
+
+
+def write_atomically(path, content):
+    # A crash mid-write must not leave a truncated statement behind
+    with open(f"{path}.tmp", 'w', newline='', encoding='utf-8') as f:
+        if isinstance(content, str):
+            f.write(content)
+        else:
+            csv.writer(f).writerows(content)
+    os.replace(f"{path}.tmp", path)
+
+
+def write_statement(month_dir, customer, month, accounts, rows, transfers, formats):
+    if 'csv' in formats:
+        write_atomically(os.path.join(month_dir, f"{customer['id']}.csv"), [STATEMENT_HEADER, *rows])
+    if 'html' in formats:
+        for account in accounts:
+            account['transactions'] = [
+                dict(zip(STATEMENT_HEADER, row), date=timezone.localtime(row[1]))
+                for row in rows if row[2] == account['id']
+            ]
+        html = render_to_string('statement.html', {
+            'customer': customer, 'month': month, 'accounts': accounts, 'transfers': transfers,
+        })
+        write_atomically(os.path.join(month_dir, f"{customer['id']}.html"), html)
+
+
+def generate_partition(month, low, high, month_dir, formats=STATEMENT_FORMATS):
+    """Write the statements of every customer with an id in [low, high).
+
+    Runs in a pool worker. The checkpoint file is written last, so a
+    partition that was interrupted is simply redone by the next run.
+    Returns (low, high, statements_written).
+    """
+    start, end = month_range(month)
+    customers = list(Customer.objects.filter(id__gte=low, id__lt=high).order_by('id').values('id', 'full_name', 'email'))
+    if customers:
+        accounts = defaultdict(list)
+        for account in Account.objects.filter(customer_id__gte=low, customer_id__lt=high).order_by('id').values('id', 'customer_id', 'account_type'):
+            accounts[account['customer_id']].append(account)
+        opening, closing = ledger_totals(low, high, start), ledger_totals(low, high, end)
+        transfers = month_transfers(low, high, start, end)
+
+        groups = groupby(month_transactions(low, high, start, end), key=itemgetter(0))
+        group = next(groups, None)
+        for customer in customers:
+            rows = []
+            if group is not None and group[0] == customer['id']:
+                rows = [row[1:] for row in group[1]]
+                group = next(groups, None)
+            for account in accounts[customer['id']]:
+                account['opening_balance'] = opening.get(account['id'], Decimal('0.00'))
+                account['closing_balance'] = closing.get(account['id'], Decimal('0.00'))
+            write_statement(month_dir, customer, month, accounts[customer['id']], rows, transfers.get(customer['id'], []), formats)
+
+    write_atomically(checkpoint_path(month_dir, low, high), json.dumps({'statements': len(customers)}))
+    return low, high, len(customers)
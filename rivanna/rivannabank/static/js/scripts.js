@@ -3,6 +3,13 @@ document.addEventListener("DOMContentLoaded", () => {
     if (window.location.href.includes("Check-Balance")) {
         initCheckBalanceForm();
     }
+    if (window.location.href.includes("Transaction-History")) {
+        initLoadMoreTransactions();
+        initLiveTransactions();
+    }
+    if (document.getElementById("transfer-status")) {
+        initTransferStatusPolling();
+    }
     const menuBtn = document.querySelector(".menu-btn");
     const menuOptions = document.querySelector(".menu-options");
 
@@ -45,15 +52,7 @@ function initCheckBalanceForm() {
 
         const formData = new FormData(form);
 
-        fetch("/Check-Balance", {
-            method: "POST",
-            headers: {
-                "X-Requested-With": "XMLHttpRequest",
-                "X-CSRFToken": formData.get("csrfmiddlewaretoken"),
-            },
-            body: formData,
-        })
-        .then((res) => res.json())
+        fetchBalance(formData)
         .then((data) => {
             responseDiv.innerHTML = ""; // Remove spinner
 
@@ -81,4 +80,145 @@ function initCheckBalanceForm() {
             responseSection.style.display = "none";
         });
     });
-}
\ No newline at end of file
+}
+
+function fetchBalance(formData) {
+    if (formData.has("password")) {
+        // The password still has to be checked once; that POST also opens the step-up window
+        return fetch("/Check-Balance", {
+            method: "POST",
+            headers: {
+                "X-Requested-With": "XMLHttpRequest",
+                "X-CSRFToken": formData.get("csrfmiddlewaretoken"),
+            },
+            body: formData,
+        }).then((res) => res.json());
+    }
+
+    // Inside the window every account comes from one GET; the browser revalidates
+    // its cached copy with If-None-Match and reuses it on a 304
+    const accountType = formData.get("account_type");
+    return fetch("/Check-Balance/summary", {
+        headers: { "X-Requested-With": "XMLHttpRequest" },
+        cache: "no-cache",
+    })
+    .then((res) => {
+        if (res.status === 403) {
+            // Step-up expired: reload so the form asks for the password again
+            window.location.reload();
+        }
+        return res.json();
+    })
+    .then((data) => {
+        if (data.error) {
+            return data;
+        }
+        const account = data.accounts.find((a) => a.account_type === accountType);
+        if (!account) {
+            const name = accountType.charAt(0).toUpperCase() + accountType.slice(1);
+            return { error: `${name} account not found.` };
+        }
+        return { balance: account.balance };
+    });
+}
+
+function transactionRow(tx) {
+    const amount = tx.amount.startsWith("-")
+        ? `<span class="text-danger">$${tx.amount}</span>`
+        : `<span class="text-success">+$${tx.amount}</span>`;
+    const balance = tx.balance_after_transaction === null ? "" : tx.balance_after_transaction;
+    const row = document.createElement("tr");
+    row.innerHTML = `
+        <td>${tx.date}</td>
+        <td>${tx.transaction_type}</td>
+        <td>${amount}</td>
+        <td>${tx.status}</td>
+        <td>$${balance}</td>
+    `;
+    return row;
+}
+
+function initLiveTransactions() {
+    const rows = document.getElementById("transaction-rows");
+    if (!rows || !window.EventSource) {
+        return;
+    }
+
+    const feed = new EventSource("/Transaction-History/live");
+    feed.addEventListener("transaction", (e) => {
+        rows.prepend(transactionRow(JSON.parse(e.data)));
+    });
+    feed.addEventListener("resync", () => {
+        // Too many events were missed; reload the newest page instead
+        window.location.reload();
+    });
+}
+
+function initLoadMoreTransactions() {
+    const button = document.getElementById("load-more");
+    const rows = document.getElementById("transaction-rows");
+    if (!button || !rows) {
+        return;
+    }
+
+    button.addEventListener("click", function () {
+        button.disabled = true;
+        const cursor = encodeURIComponent(button.dataset.nextCursor);
+
+        fetch(`/Transaction-History/more?cursor=${cursor}`, {
+            headers: { "X-Requested-With": "XMLHttpRequest" },
+        })
+        .then((res) => res.json())
+        .then((data) => {
+            if (data.error) {
+                throw new Error(data.error);
+            }
+            data.transactions.forEach((tx) => {
+                rows.appendChild(transactionRow(tx));
+            });
+
+            if (data.next_cursor) {
+                button.dataset.nextCursor = data.next_cursor;
+                button.disabled = false;
+            } else {
+                button.remove();
+            }
+        })
+        .catch((err) => {
+            console.error(err);
+            button.disabled = false;
+        });
+    });
+}
+
+function initTransferStatusPolling() {
+    const status = document.getElementById("transfer-status");
+    let delay = 1000;
+
+    function poll() {
+        fetch(status.dataset.statusUrl, {
+            headers: { "X-Requested-With": "XMLHttpRequest" },
+        })
+        .then((res) => res.json())
+        .then((data) => {
+            if (data.error) {
+                throw new Error(data.error);
+            }
+            if (data.pending) {
+                // Back off gently while the transfer waits in the queue
+                delay = Math.min(delay * 2, 10000);
+                setTimeout(poll, delay);
+                return;
+            }
+            status.textContent = data.status === "Completed"
+                ? `💸 Status: ${data.status}`
+                : `Status: ${data.status}. ${data.status_detail}`;
+        })
+        .catch((err) => {
+            console.error(err);
+            status.textContent = "Status: unknown. Check your transaction history.";
+        });
+    }
+
+    setTimeout(poll, delay);
+}
@@ -0,0 +1,117 @@
+import gzip
+import json
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.utils.functional import cached_property
+
+try:
+    import brotli
+except ImportError:  # .br copies are skipped without the brotli package
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # WebP variants are skipped without Pillow
+    Image = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt')
+RESIZABLE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+class OptimizedStaticFilesStorage(ManifestStaticFilesStorage):
+    """collectstatic storage that writes content-hashed names plus build-time variants.
+
+    After hashing, every compressible file gets .gz (and, with brotli
+    installed, .br) copies for the web server to send as-is, and every
+    PNG/JPEG gets WebP variants at the STATIC_IMAGE_WIDTHS well below its own
+    width plus one at full width. The variants are listed in
+    image_variants_name so templates can build srcsets from them. Variants of
+    an unchanged file are not rebuilt.
+    """
+
+    image_variants_name = 'staticfiles-images.json'
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        variants = {}
+        for name, hashed_name in list(self.hashed_files.items()):
+            extension = os.path.splitext(name)[1].lower()
+            if extension in COMPRESSIBLE_EXTENSIONS:
+                for compressed_name in self.compress(hashed_name):
+                    yield name, compressed_name, True
+            elif extension in RESIZABLE_EXTENSIONS and Image is not None:
+                variants[name] = self.webp_variants(hashed_name)
+                for _, variant_name in variants[name]:
+                    # Already content-hashed, so {% static %} maps the name to itself
+                    self.hashed_files[variant_name] = variant_name
+                    yield name, variant_name, True
+
+        self.save_manifest()
+        if self.exists(self.image_variants_name):
+            self.delete(self.image_variants_name)
+        self._save(self.image_variants_name, ContentFile(json.dumps(variants, indent=1).encode()))
+        self.__dict__.pop('image_variants', None)
+
+    def compress(self, hashed_name):
+        with self.open(hashed_name) as f:
+            content = f.read()
+        if len(content) < settings.STATIC_COMPRESS_MIN_SIZE:
+            return
+        encoders = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            encoders.append(('.br', lambda data: brotli.compress(data, quality=11)))
+        for suffix, encode in encoders:
+            compressed = encode(content)
+            # Only keep a copy that actually saves bytes
+            if len(compressed) < len(content):
+                if self.exists(hashed_name + suffix):
+                    self.delete(hashed_name + suffix)
+                self._save(hashed_name + suffix, ContentFile(compressed))
+                yield hashed_name + suffix
+
+    def webp_variants(self, hashed_name):
+        with self.open(hashed_name) as f:
+            image = Image.open(BytesIO(f.read()))
+            image.load()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or 'A' in image.getbands() else 'RGB')
+        original_width = image.width
+        # A step barely below the original saves little and can encode larger
+        widths = sorted({width for width in settings.STATIC_IMAGE_WIDTHS if width <= original_width * 0.8} | {original_width})
+
+        root = os.path.splitext(hashed_name)[0]
+        variants = []
+        for width in widths:
+            variant_name = f"{root}.{width}w.webp"
+            # The hashed name changes with the source, so an existing variant is current
+            if not self.exists(variant_name):
+                height = round(image.height * width / original_width)
+                resized = image if width == original_width else image.resize((width, height), Image.LANCZOS)
+                buffer = BytesIO()
+                resized.save(buffer, 'WEBP', quality=settings.STATIC_WEBP_QUALITY)
+                self._save(variant_name, ContentFile(buffer.getvalue()))
+            variants.append((width, variant_name))
+        return variants
+
+    @cached_property
+    def image_variants(self):
+        """{name: [(width, hashed webp name), ...]} from the last collectstatic, or {}."""
+        try:
+            with self.open(self.image_variants_name) as f:
+                return json.loads(f.read())
+        except FileNotFoundError:
+            return {}
+
+    def url(self, name, force=False):
+        # Before the first collectstatic (fresh checkout, test runs) there is no manifest; serve source names
+        if not self.hashed_files:
+            return FileSystemStorage.url(self, name)
+        return super().url(name, force)
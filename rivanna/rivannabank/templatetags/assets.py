@@ -0,0 +1,24 @@
+from django import template
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(name, alt, sizes='100vw', **attrs):
+    """<picture> for a static image: a WebP srcset when collectstatic built variants, else a plain <img>.
+
+    Extra keyword arguments become <img> attributes, e.g.
+    {% picture 'images/3DMobile.png' "3D mobile image" class="home-image" %}.
+    """
+    img = format_html(
+        '<img src="{}" alt="{}"{}>',
+        static(name), alt, format_html_join('', ' {}="{}"', attrs.items()),
+    )
+    variants = getattr(staticfiles_storage, 'image_variants', {}).get(name)
+    if not variants:
+        return img
+    srcset = ", ".join(f"{static(variant_name)} {width}w" for width, variant_name in variants)
+    return format_html('<picture><source type="image/webp" srcset="{}" sizes="{}">{}</picture>', srcset, sizes, img)
@@ -0,0 +1,29 @@
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+
+class QueryBudgetTestMixin:
+    """TestCase mixin that fails a request exceeding its view's @query_budget."""
+
+    def assertWithinQueryBudget(self, method, path, data=None, **extra):
+        budget = getattr(resolve(path).func, 'query_budget', None)
+        if budget is None:
+            self.fail(f"{path} does not declare a @query_budget")
+
+        contexts = [CaptureQueriesContext(connection) for connection in connections.all()]
+        for context in contexts:
+            context.__enter__()
+        try:
+            response = getattr(self.client, method.lower())(path, data, **extra)
+        finally:
+            for context in reversed(contexts):
+                context.__exit__(None, None, None)
+
+        executed = [query['sql'] for context in contexts for query in context.captured_queries]
+        if len(executed) > budget:
+            self.fail(
+                f"{method.upper()} {path} ran {len(executed)} queries, budget is {budget}:\n"
+                + "\n".join(f"{i}. {sql}" for i, sql in enumerate(executed, start=1))
+            )
+        return response
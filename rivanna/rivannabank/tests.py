@@ -1,3 +1,1001 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.db import connection, connections
+from django.db.models import Sum
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import logs, services, statements, views
+from .admin import EstimatedCountPaginator
+from .caching import recipient_cache
+from .context import invalidate_customer_context
+from .events import event_bus
+from .logs import CorrelationIdFilter, CorrelationIdMiddleware, JSONFormatter, QueueLogHandler, SamplingFilter
+from .routers import PrimaryReplicaRouter, ReplicaRoutingMiddleware
+from .storage import Image
+from .templatetags.assets import picture
+from .testing import QueryBudgetTestMixin
+from .throttling import LocalBucketBackend, login_throttle
+from .models import Customer, Account, DailyRollup, IdempotencyKey, Login, Transaction, ArchivedTransaction, FundTransfer, LedgerEntry
+
+
+def make_customer(name, email, balance=Decimal('0.00')):
+    customer = Customer.objects.create(full_name=name, phone=email, email=email)
+    # Ids come back after each test's rollback, and on_commit invalidation never runs inside TestCase
+    invalidate_customer_context(customer.id)
+    savings = Account.objects.create(customer=customer, account_type='savings', balance=balance)
+    chequing = Account.objects.create(customer=customer, account_type='chequing', balance=balance)
+    return customer, savings, chequing
+
+
+class BalanceServiceTests(TestCase):
+    def setUp(self):
+        _, self.savings, self.chequing = make_customer("Ann Lee", "ann@example.com", Decimal('100.00'))
+
+    def test_deposit_records_balance_after_transaction(self):
+        tx = services.deposit(self.savings.id, Decimal('25.50'))
+        self.savings.refresh_from_db()
+        self.assertEqual(self.savings.balance, Decimal('125.50'))
+        self.assertEqual(tx.balance_after_transaction, Decimal('125.50'))
+
+    def test_withdrawal_cannot_overdraw(self):
+        with self.assertRaises(services.InsufficientFunds):
+            services.post_transaction(self.savings.id, 'Withdrawal', Decimal('100.01'))
+        self.savings.refresh_from_db()
+        self.assertEqual(self.savings.balance, Decimal('100.00'))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_fund_transfer_moves_money_and_writes_both_legs(self):
+        transfer = FundTransfer(amount=40, sender_account=self.savings, receiver_account=self.chequing)
+        transfer.save()
+        self.assertEqual(transfer.status, 'Completed')
+        self.assertEqual(self.savings.balance, Decimal('60.00'))
+        self.assertEqual(self.chequing.balance, Decimal('140.00'))
+        self.assertEqual(
+            sorted(Transaction.objects.values_list('amount', 'balance_after_transaction')),
+            [(Decimal('-40.00'), Decimal('60.00')), (Decimal('40.00'), Decimal('140.00'))],
+        )
+
+    def test_transfer_rejects_insufficient_funds(self):
+        with self.assertRaises(services.InsufficientFunds):
+            services.transfer(self.savings.id, self.chequing.id, Decimal('500.00'))
+        self.assertEqual(
+            list(Account.objects.order_by('id').values_list('balance', flat=True)),
+            [Decimal('100.00'), Decimal('100.00')],
+        )
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        _, self.savings, self.chequing = make_customer("Ann Lee", "ann@example.com")
+        _, _, self.bob = make_customer("Bob", "bob@example.com")
+
+    def ledger_total(self, account):
+        return LedgerEntry.objects.filter(account=account).aggregate(total=Sum('amount'))['total']
+
+    def test_every_movement_appends_a_balanced_journal(self):
+        services.deposit(self.savings.id, Decimal('80.00'))
+        services.post_transaction(self.savings.id, 'Withdrawal', Decimal('5.00'))
+        services.transfer(self.savings.id, self.chequing.id, Decimal('25.00'))
+        services.batch_transfer(self.chequing.id, [{'email': 'bob@example.com', 'amount': '10.00'}])
+
+        self.assertEqual(services.unbalanced_journals(), [])
+        for account in (self.savings, self.chequing, self.bob):
+            account.refresh_from_db()
+            self.assertEqual(self.ledger_total(account), account.balance)
+        self.assertEqual(self.savings.balance, Decimal('50.00'))
+
+    def test_entries_are_append_only(self):
+        services.deposit(self.savings.id, Decimal('1.00'))
+        entry = LedgerEntry.objects.first()
+        entry.amount = Decimal('1000.00')
+        with self.assertRaises(ValueError):
+            entry.save()
+
+    def test_rebuild_resets_drifted_projection(self):
+        services.deposit(self.savings.id, Decimal('30.00'))
+        Account.objects.filter(id=self.savings.id).update(balance=Decimal('999.00'))
+
+        drift = services.rebuild_balances(self.savings.id, self.bob.id + 1)
+        self.assertEqual(drift, {self.savings.id: (Decimal('999.00'), Decimal('30.00'))})
+        self.savings.refresh_from_db()
+        self.assertEqual(self.savings.balance, Decimal('30.00'))
+        self.assertEqual(services.rebuild_balances(self.savings.id, self.bob.id + 1), {})
+
+    def test_reconcile_rechecks_only_accounts_with_new_activity(self):
+        # Bob predates the ledger: his legacy row is covered by an opening journal
+        Transaction.objects.bulk_create([Transaction(transaction_type='Deposit', amount=Decimal('40.00'), account=self.bob, status='Completed')])
+        Transaction.objects.update(date=timezone.now() - timedelta(days=30))
+        Account.objects.filter(id=self.bob.id).update(balance=Decimal('40.00'))
+        LedgerEntry.objects.bulk_create(services.journal_entries((self.bob.id, Decimal('40.00')), ('opening', Decimal('-40.00'))))
+        services.deposit(self.savings.id, Decimal('80.00'))
+        services.transfer(self.savings.id, self.bob.id, Decimal('10.00'))
+        end_id = self.bob.id + 1
+
+        self.assertEqual(services.reconcile_range(0, end_id), (4, []))
+        self.assertEqual(services.reconcile_range(0, end_id), (0, []))
+
+        services.deposit(self.chequing.id, Decimal('5.00'))
+        Account.objects.filter(id=self.savings.id).update(balance=Decimal('71.00'))
+        self.assertEqual(services.reconcile_range(0, end_id), (1, []))
+        checked, found = services.reconcile_range(0, end_id, full=True)
+        self.assertEqual(checked, 4)
+        self.assertEqual({check for account_id, check, *_ in found if account_id == self.savings.id}, {'ledger', 'transactions', 'last_balance'})
+        # Until it is fixed, the drifted account is re-checked on every run
+        self.assertEqual(services.reconcile_range(0, end_id)[0], 1)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        customer, self.savings, _ = make_customer("Ann Lee", "ann@example.com")
+        self.customer_id = customer.id
+        for _ in range(30):
+            services.deposit(self.savings.id, Decimal('1.00'))
+        old = list(Transaction.objects.order_by('id').values_list('id', flat=True)[:20])
+        Transaction.objects.filter(id__in=old).update(date=timezone.now() - timedelta(days=400))
+
+    def archive(self, batch_size=7):
+        cutoff = timezone.now() - timedelta(days=365)
+        after_id, total = 0, 0
+        while after_id is not None:
+            moved, after_id = services.archive_transaction_batch(cutoff, after_id, batch_size)
+            total += moved
+        return total
+
+    def test_archive_moves_only_cold_rows_and_is_rerunnable(self):
+        self.assertEqual(self.archive(), 20)
+        self.assertEqual(self.archive(), 0)
+        self.assertEqual(Transaction.objects.count(), 10)
+        self.assertEqual(ArchivedTransaction.objects.count(), 20)
+
+    def test_history_and_statement_read_across_tables(self):
+        expected = list(Transaction.objects.order_by('-date', '-id').values_list('id', flat=True))
+        account_ids = list(Account.objects.filter(customer_id=self.customer_id).values_list('id', flat=True))
+        self.archive()
+
+        seen, cursor = [], None
+        while True:
+            rows, cursor = views.history_page(account_ids, cursor, limit=8)
+            seen += [row.id for row in rows]
+            if not cursor:
+                break
+        self.assertEqual(seen, expected)
+        self.assertEqual([row[0] for row in views.statement_rows(self.customer_id, chunk_size=6)], expected[::-1])
+
+
+class IndexMigrationTests(TestCase):
+    def test_hot_lookup_indexes_have_their_column_order(self):
+        with connection.cursor() as cursor:
+            account = connection.introspection.get_constraints(cursor, Account._meta.db_table)
+            transaction = connection.introspection.get_constraints(cursor, Transaction._meta.db_table)
+        self.assertEqual(account['account_customer_type_idx']['columns'], ['customer_id', 'account_type'])
+        self.assertEqual(transaction['transaction_account_date_idx']['columns'], ['account_id', 'date', 'id'])
+        # History reads newest first, so date and its id tie-break are stored descending
+        self.assertEqual(transaction['transaction_account_date_idx']['orders'], ['ASC', 'DESC', 'DESC'])
+
+
+class HistoryPaginationTests(TestCase):
+    def setUp(self):
+        customer, self.savings, self.chequing = make_customer("Ann Lee", "ann@example.com")
+        session = self.client.session
+        session['customer_id'] = customer.id
+        session.save()
+
+    def test_cursor_boundary_inside_a_run_of_equal_dates(self):
+        # Alternate accounts so every page merges both accounts' streams
+        for i in range(7):
+            services.deposit((self.savings, self.chequing)[i % 2].id, Decimal('1.00'))
+        # Every row shares one timestamp, so only the id orders them
+        Transaction.objects.update(date=timezone.make_aware(datetime(2024, 1, 1, 12)))
+        expected = list(Transaction.objects.order_by('-id').values_list('id', flat=True))
+
+        account_ids = [self.savings.id, self.chequing.id]
+        rows, first_cursor = views.history_page(account_ids, limit=3)
+        seen, cursor = [row.id for row in rows], first_cursor
+        while cursor:
+            rows, cursor = views.history_page(account_ids, cursor, limit=3)
+            seen += [row.id for row in rows]
+        self.assertEqual(seen, expected)
+
+        response = self.client.get('/Transaction-History/more', {'cursor': first_cursor})
+        self.assertEqual([tx['id'] for tx in response.json()['transactions']], expected[3:])
+        self.assertEqual(self.client.get('/Transaction-History/more', {'cursor': 'bogus'}).status_code, 400)
+
+    def test_pages_read_the_index_without_sorting(self):
+        services.deposit(self.chequing.id, Decimal('1.00'))
+        after = views.decode_history_cursor(views.encode_history_cursor(Transaction.objects.get()))
+        for model in (Transaction, ArchivedTransaction):
+            for position in (None, after):
+                plan = views.account_history(model, self.chequing.id, position).explain().upper()
+                # SQLite says TEMP B-TREE, MySQL filesort, PostgreSQL Sort
+                self.assertNotIn('TEMP B-TREE', plan)
+                self.assertNotIn('FILESORT', plan)
+                self.assertNotRegex(plan, r'(^|\W)SORT(\W|$)')
+
+
+class StatementExportTests(TestCase):
+    def setUp(self):
+        customer, _, self.chequing = make_customer("Ann Lee", "ann@example.com")
+        session = self.client.session
+        session['customer_id'] = customer.id
+        session.save()
+        for amount in ('1.00', '2.00', '3.00'):
+            services.deposit(self.chequing.id, Decimal(amount))
+
+    def test_headers_are_ready_before_any_row_is_read(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/Transaction-History/export', {'format': 'ndjson'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="statement-all-latest.ndjson"')
+        # Rows are only fetched as the body is consumed
+        tables = (Transaction._meta.db_table, ArchivedTransaction._meta.db_table)
+        self.assertFalse([query for query in queries.captured_queries if any(table in query['sql'] for table in tables)])
+
+        with CaptureQueriesContext(connection) as queries:
+            rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['amount'] for row in rows], ['1.00', '2.00', '3.00'])
+        # One short keyset chunk from each table
+        self.assertEqual(len(queries.captured_queries), 2)
+
+        for params in ({'start': '2024-13-01'}, {'start': '2024-02-01', 'end': '2024-01-01'}, {'format': 'xml'}):
+            self.assertEqual(self.client.get('/Transaction-History/export', params).status_code, 400)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        customer, _, self.chequing = make_customer("Ann Lee", "ann@example.com")
+        _, _, self.bob = make_customer("Bob", "bob@example.com")
+        session = self.client.session
+        session['customer_id'] = customer.id
+        session.save()
+
+    def rollups(self):
+        return sorted(DailyRollup.objects.values_list('account_id', 'day', 'transaction_type', 'credits', 'debits', 'transaction_count'))
+
+    def test_incremental_rollups_match_a_rebuild_and_feed_analytics(self):
+        services.deposit(self.chequing.id, Decimal('100.00'))
+        services.deposit(self.chequing.id, Decimal('20.00'))
+        services.post_transaction(self.chequing.id, 'Withdrawal', Decimal('15.00'))
+        services.transfer(self.chequing.id, self.bob.id, Decimal('30.00'))
+        services.batch_transfer(self.chequing.id, [{'email': 'bob@example.com', 'amount': '5.00'}])
+        incremental = self.rollups()
+        services.archive_transaction_batch(timezone.now() + timedelta(seconds=1), batch_size=2)
+
+        self.assertEqual(services.rebuild_rollups(0, self.bob.id + 1), len(incremental))
+        self.assertEqual(self.rollups(), incremental)
+
+        month = self.client.get('/Analytics', {'account_type': 'chequing'}).json()['months'][-1]
+        self.assertEqual((month['income'], month['spending']), ('120.00', '-50.00'))
+        self.assertEqual(month['by_type']['Deposit'], {'income': '120.00', 'spending': '0.00', 'transaction_count': 2})
+        self.assertEqual(month['by_type']['E-Transfer']['transaction_count'], 2)
+
+
+class StatementTests(TestCase):
+    def test_month_statements_merge_archive_and_resume_from_checkpoints(self):
+        customer, _, chequing = make_customer("Ann Lee", "ann@example.com")
+        _, _, bob = make_customer("Bob", "bob@example.com")
+        for day, amount in ((3, '100.00'), (20, '50.00'), (40, '7.00')):
+            deposit = services.deposit(chequing.id, Decimal(amount))
+            Transaction.objects.filter(id=deposit.id).update(date=timezone.make_aware(datetime(2024, 1, 1) + timedelta(days=day)))
+        FundTransfer(amount=Decimal('25.00'), sender_account=chequing, receiver_account=bob).save()
+        FundTransfer.objects.update(date=timezone.make_aware(datetime(2024, 1, 25)))
+        services.archive_transaction_batch(timezone.make_aware(datetime(2024, 1, 10)))
+
+        with tempfile.TemporaryDirectory() as out:
+            call_command('generate_statements', month='2024-01', output_dir=out, processes=1, partition_size=1, stdout=io.StringIO())
+            month_dir = os.path.join(out, '2024-01')
+            with open(os.path.join(month_dir, f"{customer.id}.csv")) as f:
+                amounts = [line.split(',')[5] for line in f.read().splitlines()[1:] if line.split(',')[2] == str(chequing.id)]
+            self.assertEqual(amounts, ['100.00', '50.00'])
+            with open(os.path.join(month_dir, f"{customer.id}.html")) as f:
+                html = f.read()
+            self.assertIn("bob@example.com", html)
+            self.assertTrue(os.path.exists(statements.checkpoint_path(month_dir, customer.id, customer.id + 1)))
+
+            # A rerun skips every checkpointed partition
+            os.remove(os.path.join(month_dir, f"{customer.id}.csv"))
+            call_command('generate_statements', month='2024-01', output_dir=out, processes=1, partition_size=1, stdout=io.StringIO())
+            self.assertFalse(os.path.exists(os.path.join(month_dir, f"{customer.id}.csv")))
+
+            # Checkpoints name id ranges, so a resume with another partition size is refused
+            with self.assertRaisesMessage(CommandError, "--partition-size 1"):
+                call_command('generate_statements', month='2024-01', output_dir=out, processes=1, partition_size=2, stdout=io.StringIO())
+            call_command('generate_statements', month='2024-01', output_dir=out, processes=1, partition_size=2, restart=True, stdout=io.StringIO())
+            self.assertTrue(os.path.exists(os.path.join(month_dir, f"{customer.id}.csv")))
+
+
+class BatchTransferTests(TestCase):
+    def setUp(self):
+        _, self.sender, _ = make_customer("Payroll Inc", "payroll@example.com", Decimal('100.00'))
+        _, _, self.alice = make_customer("Alice", "alice@example.com")
+        _, _, self.bob = make_customer("Bob", "bob@example.com")
+
+    def test_batch_reports_each_row_and_moves_exact_totals(self):
+        rows = services.read_transfer_rows(
+            "email,amount\nalice@example.com,30.00\nbob@example.com,20.00\n"
+            "nobody@example.com,5.00\nalice@example.com,abc\nbob@example.com,60.00\n",
+            'csv',
+        )
+        results = services.batch_transfer(self.sender.id, rows)
+
+        self.assertEqual([result['status'] for result in results], ['Completed', 'Completed', 'Failed', 'Failed', 'Failed'])
+        self.assertEqual(results[1]['balance_after'], Decimal('50.00'))
+        self.assertEqual(
+            dict(Account.objects.filter(id__in=[self.sender.id, self.alice.id, self.bob.id]).values_list('id', 'balance')),
+            {self.sender.id: Decimal('50.00'), self.alice.id: Decimal('30.00'), self.bob.id: Decimal('20.00')},
+        )
+        self.assertEqual(FundTransfer.objects.count(), 2)
+        self.assertEqual(Transaction.objects.count(), 4)
+
+    def test_view_matches_onboarded_account_types(self):
+        # Onboarding names the accounts 'Chequing' and 'Savings'
+        customer = services.onboard_customer("Cal Roe", "555-0101", "cal@example.com", "1 Main St", "cal", "secret")
+        invalidate_customer_context(customer.id)
+        chequing = customer.account_set.get(account_type='Chequing')
+        services.deposit(chequing.id, Decimal('40.00'))
+        session = self.client.session
+        session['customer_id'] = customer.id
+        session.save()
+
+        for account_type in ('chequing', 'Chequing'):
+            response = self.client.post(
+                '/SendMoney/batch',
+                json.dumps({'account_type': account_type, 'transfers': [{'email': 'alice@example.com', 'amount': '15.00'}]}),
+                content_type='application/json',
+            )
+            self.assertEqual(response.json()['completed'], 1)
+        self.assertEqual(Account.objects.get(id=chequing.id).balance, Decimal('10.00'))
+        self.assertEqual(Account.objects.get(id=self.alice.id).balance, Decimal('30.00'))
+
+        response = self.client.post('/SendMoney/batch', json.dumps({'account_type': 'Brokerage', 'transfers': []}), content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(ASYNC_TRANSFERS=True)
+class TransferQueueTests(TestCase):
+    def setUp(self):
+        recipient_cache.clear()
+        customer, _, self.sender = make_customer("Ann Lee", "ann@example.com", Decimal('50.00'))
+        _, _, self.bob = make_customer("Bob", "bob@example.com")
+        session = self.client.session
+        session['customer_id'] = customer.id
+        session.save()
+
+    def send(self, amount):
+        response = self.client.post('/SendMoney', {'amount': amount, 'account_type': 'chequing', 'email': 'bob@example.com'})
+        self.assertEqual(response.status_code, 202)
+        return FundTransfer.objects.latest('id')
+
+    def test_queued_transfers_settle_in_a_worker_batch(self):
+        first, second = self.send('30.00'), self.send('30.00')
+        self.assertEqual(self.client.get(f'/SendMoney/status/{first.id}').json()['pending'], True)
+        self.assertEqual(Account.objects.get(id=self.sender.id).balance, Decimal('50.00'))
+
+        self.assertEqual(services.process_transfer_queue(), {'Completed': 1, 'Failed': 1})
+        self.assertEqual(services.process_transfer_queue(), {'Completed': 0, 'Failed': 0})
+
+        status = self.client.get(f'/SendMoney/status/{second.id}').json()
+        self.assertEqual((status['status'], status['pending']), ('Failed', False))
+        self.assertIn("Insufficient", status['status_detail'])
+        self.assertEqual(self.client.get(f'/SendMoney/status/{first.id}').json()['status'], 'Completed')
+        self.assertEqual(Account.objects.get(id=self.sender.id).balance, Decimal('20.00'))
+        self.assertEqual(Account.objects.get(id=self.bob.id).balance, Decimal('30.00'))
+        self.assertEqual(LedgerEntry.objects.filter(account_id=self.bob.id).aggregate(total=Sum('amount'))['total'], Decimal('30.00'))
+
+    def test_status_is_private_to_the_sender(self):
+        queued = self.send('5.00')
+        session = self.client.session
+        session['customer_id'] = Account.objects.get(id=self.bob.id).customer_id
+        session.save()
+        self.assertEqual(self.client.get(f'/SendMoney/status/{queued.id}').status_code, 404)
+
+
+class LiveFeedTests(TestCase):
+    async def test_feed_pushes_committed_transactions_and_balances(self):
+        customer, _, chequing = await sync_to_async(make_customer)("Ann Lee", "ann@example.com")
+        session = SessionStore()
+        session['customer_id'] = customer.id
+        await session.asave()
+        self.async_client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+        response = await self.async_client.get('/Transaction-History/live')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        # Nothing is subscribed until the stream is consumed
+        self.assertEqual(event_bus.stats(), {'subscribers': 0})
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b"retry: 5000\n\n")
+
+        def deposit():
+            with self.captureOnCommitCallbacks(execute=True):
+                services.deposit(chequing.id, Decimal('5.00'))
+        await sync_to_async(deposit)()
+
+        transaction_event, balance_event = await anext(stream), await anext(stream)
+        self.assertTrue(transaction_event.startswith(b"event: transaction\n"))
+        self.assertEqual(json.loads(transaction_event.split(b"data: ")[1])['amount'], '5.00')
+        self.assertEqual(json.loads(balance_event.split(b"data: ")[1]), {'type': 'balance', 'account_id': chequing.id, 'balance': '5.00'})
+
+        # A client disconnect cancels the task streaming the response
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertEqual(event_bus.stats(), {'subscribers': 0})
+
+    @override_settings(SQL_INSTRUMENTATION_HEADERS=True)
+    async def test_async_view_queries_are_counted(self):
+        customer, _, _ = await sync_to_async(make_customer)("Ann Lee", "ann@example.com")
+        session = SessionStore()
+        session['customer_id'] = customer.id
+        await session.asave()
+        self.async_client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+        response = await self.async_client.get('/Transaction-History/live')
+        # The session read and the account lookup both run off the event loop
+        self.assertEqual(response['X-DB-Queries'], '2')
+        await response.streaming_content.aclose()
+
+
+class StepUpAuthTests(TestCase):
+    def setUp(self):
+        customer, _, self.chequing = make_customer("Ann Lee", "ann@example.com", Decimal('10.00'))
+        Login.objects.create(username="ann", password_hash=make_password("secret"), customer=customer)
+        session = self.client.session
+        session['customer_id'] = customer.id
+        session.save()
+
+    def check_balance(self, **data):
+        return self.client.post('/Check-Balance', {'account_type': 'chequing', **data}, headers={'x-requested-with': 'XMLHttpRequest'})
+
+    def test_password_is_skipped_inside_the_window(self):
+        self.assertEqual(self.check_balance().status_code, 403)
+        self.assertEqual(self.check_balance(password="secret").json(), {'balance': 10.0})
+        with patch('rivannabank.views.check_password') as check:
+            self.assertEqual(self.check_balance().json(), {'balance': 10.0})
+        check.assert_not_called()
+
+    def test_window_expires(self):
+        self.check_balance(password="secret")
+        with patch('rivannabank.views.time.time', return_value=time.time() + settings.STEP_UP_AUTH_TTL + 1):
+            self.assertEqual(self.check_balance().status_code, 403)
+
+    def test_balance_summary_revalidates_with_etag(self):
+        self.assertEqual(self.client.get('/Check-Balance/summary').status_code, 403)
+        self.check_balance(password="secret")
+
+        response = self.client.get('/Check-Balance/summary')
+        accounts = {account['account_type']: account['balance'] for account in response.json()['accounts']}
+        self.assertEqual(accounts, {'savings': '10.00', 'chequing': '10.00'})
+        etag = response.headers['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/Check-Balance/summary', headers={'if-none-match': etag}).status_code, 304)
+        # Only the version query runs on a match, not the summary after it
+        self.assertEqual(len([query for query in queries.captured_queries if 'rivannabank_account' in query['sql']]), 1)
+
+        deposit = services.deposit(self.chequing.id, Decimal('2.50'))
+        response = self.client.get('/Check-Balance/summary', headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['latest_transaction_id'], deposit.id)
+
+        # A rebuilt balance writes no ledger entry but still changes the validator
+        etag = response.headers['ETag']
+        Account.objects.filter(pk=self.chequing.pk).update(balance=Decimal('0.00'))
+        response = self.client.get('/Check-Balance/summary', headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+
+        # So does archiving, which moves the latest transaction out of the hot table
+        etag = response.headers['ETag']
+        services.archive_transaction_batch(timezone.now() + timedelta(days=1))
+        response = self.client.get('/Check-Balance/summary', headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()['latest_transaction_id'])
+
+
+class CustomerContextTests(TestCase):
+    def setUp(self):
+        self.customer, _, self.chequing = make_customer("Ann Lee", "ann@example.com")
+        session = self.client.session
+        session['customer_id'] = self.customer.id
+        session.save()
+
+    def test_context_is_cached_and_invalidated_by_account_changes(self):
+        self.client.get('/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/')
+        self.assertEqual(response.context['username'], "Ann")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Account.objects.filter(id=self.chequing.id).delete()
+            Account.objects.create(customer=self.customer, account_type='Chequing')
+        with self.assertNumQueries(1):
+            self.client.get('/')
+        response = self.client.post('/SendMoney', {'amount': '5.00', 'account_type': 'chequing', 'email': 'nobody@example.com'})
+        self.assertContains(response, "Recipient email not registered.", status_code=404)
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class ReplicaRoutingTests(TestCase):
+    def route(self, request):
+        # Which alias each model is read from while the request is handled
+        router = PrimaryReplicaRouter()
+        middleware = ReplicaRoutingMiddleware(lambda request: HttpResponse(
+            f"{router.db_for_read(Account)} {router.db_for_read(Session)} {router.db_for_write(Account)}"
+        ))
+        return middleware(request)
+
+    def test_safe_requests_read_from_a_replica(self):
+        response = self.route(RequestFactory().get('/'))
+        self.assertEqual(response.content.decode(), "replica default default")
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        # Outside a request (commands, workers) reads stay on the primary
+        self.assertEqual(PrimaryReplicaRouter().db_for_read(Account), 'default')
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        response = self.route(RequestFactory().post('/Deposit'))
+        self.assertEqual(response.content.decode(), "default default default")
+        self.assertEqual(response.cookies[settings.REPLICA_PIN_COOKIE]['max-age'], settings.REPLICA_PIN_SECONDS)
+
+        request = RequestFactory().get('/')
+        request.COOKIES[settings.REPLICA_PIN_COOKIE] = '1'
+        self.assertEqual(self.route(request).content.decode(), "default default default")
+
+    def test_replicas_are_not_migrated(self):
+        router = PrimaryReplicaRouter()
+        self.assertIs(router.allow_migrate('replica', 'rivannabank'), False)
+        self.assertIsNone(router.allow_migrate('default', 'rivannabank'))
+
+
+@skipUnless('replica' in settings.DATABASES, "Needs a replica alias: --settings=rivanna.test_replica_settings")
+@override_settings(REPLICA_DATABASES=['replica'])
+class ReplicaDatabaseTests(TestCase):
+    # The runner checks every listed alias, even for a skipped class
+    databases = {'default', 'replica'} if 'replica' in settings.DATABASES else {'default'}
+
+    def setUp(self):
+        customer, savings, chequing = make_customer("Ann Lee", "ann@example.com", Decimal('10.00'))
+        # The replica lags: same rows, older balances
+        Customer.objects.using('replica').bulk_create([customer])
+        Account.objects.using('replica').bulk_create([
+            Account(id=account.id, customer_id=customer.id, account_type=account.account_type, balance=Decimal('7.00'))
+            for account in (savings, chequing)
+        ])
+        session = self.client.session
+        session['customer_id'] = customer.id
+        session['step_up_customer_id'] = customer.id
+        session['step_up_until'] = time.time() + 60
+        session.save()
+
+    def chequing_balance(self):
+        response = self.client.get('/Check-Balance/summary')
+        return {account['account_type']: account['balance'] for account in response.json()['accounts']}['chequing']
+
+    def test_safe_get_reads_from_the_replica(self):
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            self.assertEqual(self.chequing_balance(), '7.00')
+        self.assertTrue(replica_queries.captured_queries)
+
+    def test_read_after_write_goes_to_the_primary(self):
+        response = self.client.post('/Deposit', {'amount': '5.00', 'account_type': 'chequing'})
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            self.assertEqual(self.chequing_balance(), '15.00')
+        self.assertFalse(replica_queries.captured_queries)
+
+        # Once the pin lapses the client is back on the (still lagging) replica
+        del self.client.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(self.chequing_balance(), '7.00')
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        _, self.savings, self.chequing = make_customer("Ann Lee", "ann@example.com", Decimal('100.00'))
+
+    def changelist_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(path).status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        services.transfer(self.savings.id, self.chequing.id, Decimal('1.00'))
+        counts = {path: self.changelist_queries(path) for path in ('/admin/rivannabank/fundtransfer/', '/admin/rivannabank/transaction/')}
+        for _ in range(10):
+            FundTransfer.objects.create(amount=Decimal('1.00'), sender_account=self.savings, receiver_account=self.chequing)
+        for path, count in counts.items():
+            self.assertEqual(self.changelist_queries(path), count)
+
+    def test_account_balance_is_read_only(self):
+        response = self.client.get(f'/admin/rivannabank/account/{self.savings.id}/change/')
+        self.assertContains(response, '100.00')
+        self.assertNotContains(response, 'name="balance"')
+
+    def test_date_filter_is_bounded(self):
+        services.deposit(self.savings.id, Decimal('1.00'))
+        now = timezone.now()
+        response = self.client.get('/admin/rivannabank/transaction/', {'date__gte': str(now - timedelta(days=7)), 'date__lt': str(now + timedelta(days=1))})
+        self.assertContains(response, 'Past 7 days')
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=5)
+    def test_paginator_uses_estimates_past_the_limit(self):
+        for _ in range(8):
+            services.deposit(self.savings.id, Decimal('1.00'))
+        with patch('rivannabank.admin.estimated_row_count', return_value=1000000):
+            self.assertEqual(EstimatedCountPaginator(Transaction.objects.order_by('-id'), 100).count, 1000000)
+        # Filtered pages count no further than the limit
+        self.assertEqual(EstimatedCountPaginator(Transaction.objects.filter(account=self.savings).order_by('-id'), 100).count, 5)
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        recipient_cache.clear()
+        login_throttle.reset()
+        customer, self.savings, self.chequing = make_customer("Ann Lee", "ann@example.com", Decimal('100.00'))
+        make_customer("Bob", "bob@example.com")
+        Login.objects.create(username="ann", password_hash=make_password("secret"), customer=customer)
+        for _ in range(30):
+            services.deposit(self.chequing.id, Decimal('1.00'))
+        self.assertWithinQueryBudget('post', '/Login', {'username': 'ann', 'password': 'secret'})
+
+    def test_read_views(self):
+        self.assertWithinQueryBudget('get', '/')
+        self.assertWithinQueryBudget('get', '/Transaction-History')
+        self.assertWithinQueryBudget('get', '/Transaction-History/more')
+        self.assertWithinQueryBudget('get', '/Check-Balance/summary')
+        self.assertWithinQueryBudget('get', '/Analytics')
+        self.assertWithinQueryBudget(
+            'post', '/Check-Balance', {'account_type': 'chequing', 'password': 'secret'},
+            headers={'x-requested-with': 'XMLHttpRequest'},
+        )
+
+    def test_write_views(self):
+        self.assertWithinQueryBudget('post', '/Deposit', {'amount': '5.00', 'account_type': 'chequing', 'password': 'secret'})
+        self.assertWithinQueryBudget('post', '/SendMoney', {'amount': '5.00', 'account_type': 'chequing', 'email': 'bob@example.com'})
+        self.assertWithinQueryBudget(
+            'post', '/SendMoney/batch',
+            json.dumps({'account_type': 'chequing', 'transfers': [{'email': 'bob@example.com', 'amount': '1.00'}] * 50}),
+            content_type='application/json',
+        )
+        self.assertEqual(Account.objects.get(customer__email='bob@example.com', account_type='chequing').balance, Decimal('55.00'))
+
+
+class OnboardingTests(QueryBudgetTestMixin, TestCase):
+    form = {
+        'fullname': "Ann Lee", 'phone': "555-0100", 'email': "ann@example.com",
+        'streetAddress': "1 Main St", 'address2': "Unit 2", 'city': "Charlottesville",
+        'province': "VA", 'zipcode': "22903", 'username': "ann",
+        'password': "secret", 'confirm_password': "secret",
+    }
+
+    def test_create_account_onboards_customer_atomically(self):
+        self.assertWithinQueryBudget('post', '/Create-Account', self.form)
+        customer = Customer.objects.get(email="ann@example.com")
+        self.assertTrue(Login.objects.filter(customer=customer, username="ann").exists())
+        self.assertEqual(sorted(customer.account_set.values_list('account_type', flat=True)), ['Chequing', 'Savings'])
+
+    def test_duplicate_details_are_reported(self):
+        self.client.post('/Create-Account', self.form)
+        response = self.client.post('/Create-Account', {**self.form, 'confirm_password': "other"})
+        self.assertEqual(set(response.context['errors']), {'email', 'phone', 'username', 'confirm_password'})
+        self.assertEqual(Customer.objects.count(), 1)
+
+    def test_import_skips_rows_that_clash(self):
+        rows = [
+            {'full_name': "A", 'phone': "1", 'email': "a@example.com", 'username': "a", 'password_hash': "!"},
+            {'full_name': "B", 'phone': "2", 'email': "a@example.com", 'username': "b", 'password_hash': "!"},
+            {'full_name': "C", 'phone': "3", 'email': "c@example.com", 'username': "c"},
+        ]
+        created, skipped = services.import_customers(rows)
+        self.assertEqual(created, 2)
+        self.assertEqual([reason for _, reason in skipped], ["email already registered"])
+        self.assertEqual(Account.objects.count(), 4)
+        self.assertFalse(Login.objects.get(username="c").password_hash.startswith("pbkdf2"))
+
+
+class RecipientCacheTests(TestCase):
+    def setUp(self):
+        recipient_cache.clear()
+        self.bob, _, self.bob_chequing = make_customer("Bob", "bob@example.com")
+
+    def test_second_lookup_is_a_cache_hit(self):
+        self.assertEqual(services.resolve_recipient_account("bob@example.com"), self.bob_chequing.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(services.resolve_recipient_account("bob@example.com"), self.bob_chequing.id)
+        self.assertEqual((recipient_cache.hits, recipient_cache.misses), (1, 1))
+
+    def test_email_change_invalidates_entry(self):
+        services.resolve_recipient_account("bob@example.com")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bob.email = "robert@example.com"
+            self.bob.save()
+            # Dropped only once the change commits
+            self.assertEqual(recipient_cache.stats()['size'], 1)
+        with self.assertRaises(Customer.DoesNotExist):
+            services.resolve_recipient_account("bob@example.com")
+        self.assertEqual(services.resolve_recipient_account("robert@example.com"), self.bob_chequing.id)
+
+    def test_missing_chequing_account_is_reported(self):
+        self.bob_chequing.delete()
+        with self.assertRaises(Account.DoesNotExist):
+            services.resolve_recipient_account("bob@example.com")
+        self.assertEqual(recipient_cache.stats()['size'], 0)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        recipient_cache.clear()
+        customer, _, self.chequing = make_customer("Ann Lee", "ann@example.com", Decimal('100.00'))
+        _, _, self.bob = make_customer("Bob", "bob@example.com")
+        Login.objects.create(username="ann", password_hash=make_password("secret"), customer=customer)
+        session = self.client.session
+        session['customer_id'] = customer.id
+        session.save()
+
+    def balance(self, account):
+        account.refresh_from_db()
+        return account.balance
+
+    def test_retried_deposit_posts_once_and_replays_response(self):
+        data = {'amount': '10.00', 'account_type': 'chequing', 'password': 'secret'}
+        first = self.client.post('/Deposit', data, headers={'Idempotency-Key': 'dep-1'})
+        # The session comes from the cache, so the key lookup is the only query
+        with self.assertNumQueries(1):
+            retry = self.client.post('/Deposit', data, headers={'Idempotency-Key': 'dep-1'})
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(self.balance(self.chequing), Decimal('110.00'))
+
+    def test_form_token_deduplicates_transfers(self):
+        data = {'amount': '5.00', 'account_type': 'chequing', 'email': 'bob@example.com', 'idempotency_key': 'tx-1'}
+        self.client.post('/SendMoney', data)
+        self.client.post('/SendMoney', data)
+        self.client.post('/SendMoney', {**data, 'idempotency_key': 'tx-2'})
+        self.assertEqual(self.balance(self.bob), Decimal('10.00'))
+
+    def test_failed_attempt_releases_the_key(self):
+        data = {'amount': '10.00', 'account_type': 'chequing', 'password': 'wrong'}
+        self.client.post('/Deposit', data, headers={'Idempotency-Key': 'dep-2'})
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.client.post('/Deposit', {**data, 'password': 'secret'}, headers={'Idempotency-Key': 'dep-2'})
+        self.assertEqual(self.balance(self.chequing), Decimal('110.00'))
+
+    def test_failed_transfer_retried_with_the_same_key_succeeds(self):
+        data = {'amount': '150.00', 'account_type': 'chequing', 'email': 'bob@example.com'}
+        first = self.client.post('/SendMoney', data, headers={'Idempotency-Key': 'tx-3'})
+        self.assertContains(first, "Insufficient funds", status_code=409)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        services.deposit(self.chequing.id, Decimal('100.00'))
+        retry = self.client.post('/SendMoney', data, headers={'Idempotency-Key': 'tx-3'})
+        self.assertEqual(retry.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', retry)
+        self.assertEqual(self.balance(self.bob), Decimal('150.00'))
+
+    def test_stale_claim_is_taken_over(self):
+        data = {'amount': '10.00', 'account_type': 'chequing', 'password': 'secret'}
+        claim = IdempotencyKey.objects.create(
+            customer_id=self.chequing.customer_id, key='dep-3', scope='deposit',
+            expires_at=timezone.now() + timedelta(days=1),
+        )
+        self.assertEqual(self.client.post('/Deposit', data, headers={'Idempotency-Key': 'dep-3'}).status_code, 409)
+
+        # The first attempt's worker died and never released the key
+        IdempotencyKey.objects.filter(pk=claim.pk).update(
+            claimed_at=timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_CLAIM_LEASE + 1),
+        )
+        self.assertEqual(self.client.post('/Deposit', data, headers={'Idempotency-Key': 'dep-3'}).status_code, 200)
+        self.assertEqual(self.balance(self.chequing), Decimal('110.00'))
+        self.assertEqual(IdempotencyKey.objects.get(pk=claim.pk).status_code, 200)
+
+    def test_key_reused_for_another_view_is_rejected(self):
+        self.client.post('/Deposit', {'amount': '1.00', 'account_type': 'chequing', 'password': 'secret'}, headers={'Idempotency-Key': 'k'})
+        response = self.client.post('/SendMoney', {'amount': '1.00', 'account_type': 'chequing', 'email': 'bob@example.com'}, headers={'Idempotency-Key': 'k'})
+        self.assertEqual(response.status_code, 422)
+
+
+class LoggingTests(TestCase):
+    def make_logger(self, name):
+        stream = io.StringIO()
+        handler = QueueLogHandler(stream)
+        handler.setFormatter(JSONFormatter())
+        handler.addFilter(CorrelationIdFilter())
+        handler.addFilter(SamplingFilter())
+        log = logging.getLogger(name)
+        log.addHandler(handler)
+        self.addCleanup(log.removeHandler, handler)
+        return log, handler, stream
+
+    def test_records_are_json_lines_with_the_request_correlation_id(self):
+        log, handler, stream = self.make_logger('rivannabank.tests.json')
+        middleware = CorrelationIdMiddleware(lambda request: log.info("Deposit posted", extra={'amount': Decimal('5.00')}) or HttpResponse())
+        response = middleware(RequestFactory().get('/', headers={'x-request-id': 'req-1'}))
+        handler.close()  # Waits for the listener thread to drain the queue
+
+        self.assertEqual(response['X-Request-ID'], 'req-1')
+        entry = json.loads(stream.getvalue())
+        self.assertEqual(
+            {key: entry[key] for key in ('level', 'message', 'correlation_id', 'amount')},
+            {'level': 'INFO', 'message': "Deposit posted", 'correlation_id': 'req-1', 'amount': '5.00'},
+        )
+
+    def test_fork_hook_restarts_only_open_handlers(self):
+        _, handler, _ = self.make_logger('rivannabank.tests.fork')
+        self.assertIn(handler, logs._queue_handlers)
+        handler.close()
+        self.assertNotIn(handler, logs._queue_handlers)
+
+    @override_settings(LOG_SAMPLE_RATES={'rivannabank.tests.sampled': 0.0})
+    def test_sampled_loggers_keep_warnings(self):
+        log, handler, stream = self.make_logger('rivannabank.tests.sampled.child')
+        log.info("Dropped")
+        log.warning("Kept")
+        handler.close()
+        self.assertEqual([json.loads(line)['message'] for line in stream.getvalue().splitlines()], ["Kept"])
+
+
+class StaticPipelineTests(TestCase):
+    def test_collectstatic_writes_hashed_compressed_and_webp_assets(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(STATIC_ROOT=root):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            css = staticfiles_storage.stored_name('css/styles.css')
+            self.assertNotEqual(css, 'css/styles.css')
+            self.assertTrue(staticfiles_storage.exists(css + '.gz'))
+
+            html = picture('images/3DMobile.png', "3D mobile")
+            self.assertIn(staticfiles_storage.url('images/3DMobile.png'), html)
+            if Image is not None:
+                self.assertIn('type="image/webp"', html)
+                for _, variant_name in staticfiles_storage.image_variants['images/3DMobile.png']:
+                    self.assertIn(f"/static/{variant_name}", html)
+
+
+@override_settings(LOGIN_THROTTLE_IP_RATE=(4, 60), LOGIN_THROTTLE_USERNAME_RATE=(2, 60))
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        login_throttle.reset()
+        customer, _, _ = make_customer("Ann Lee", "ann@example.com")
+        Login.objects.create(username="ann", password_hash=make_password("secret"), customer=customer)
+
+    def attempt(self, username, ip='10.0.0.1'):
+        return self.client.post('/Login', {'username': username, 'password': 'guess'}, REMOTE_ADDR=ip)
+
+    def test_username_limit_rejects_before_hashing(self):
+        self.attempt("ann")
+        self.attempt("ann", ip='10.0.0.2')
+        with patch('rivannabank.views.check_password') as check:
+            self.assertEqual(self.attempt("ann", ip='10.0.0.3').status_code, 429)
+        check.assert_not_called()
+        self.assertEqual(login_throttle.stats(), {'accepted': 2, 'rejected_ip': 0, 'rejected_username': 1})
+
+    def test_ip_limit_spans_usernames(self):
+        for username in ("a", "b", "c", "d"):
+            self.assertEqual(self.attempt(username).status_code, 200)
+        self.assertEqual(self.attempt("e").status_code, 429)
+        self.assertEqual(self.attempt("e", ip='10.0.0.9').status_code, 200)
+        self.assertEqual(login_throttle.stats()['rejected_ip'], 1)
+
+    @override_settings(LOGIN_THROTTLE_BACKEND='rivannabank.throttling.CacheBucketBackend')
+    def test_cache_backend(self):
+        login_throttle.reset()
+        self.attempt("ann")
+        self.attempt("ann")
+        self.assertEqual(self.attempt("ann").status_code, 429)
+        caches['default'].clear()
+
+    def test_prune_refills_each_bucket_at_its_own_rate(self):
+        backend = LocalBucketBackend()
+        backend.MAX_BUCKETS = 1
+        with patch('rivannabank.throttling.time.monotonic', side_effect=[0, 1, 2]):
+            self.assertTrue(backend.take("user:ann", 1, 3600))
+            # A fast-refilling bucket triggers the prune; the drained slow one must survive it
+            self.assertTrue(backend.take("ip:10.0.0.1", 100, 1))
+            self.assertFalse(backend.take("user:ann", 1, 3600))
+
+
+class BenchCommandTests(TransactionTestCase):
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("Bench threads need a file-backed or server test database.")
+
+    def test_report_covers_every_view(self):
+        with tempfile.TemporaryDirectory() as out:
+            output = os.path.join(out, 'bench.json')
+            # Seed into this test database rather than creating a second one
+            with patch('rivannabank.management.commands.bench.scratch_database', contextlib.nullcontext):
+                call_command('bench', customers=3, transactions=2, threads=2, iterations=2, output=output, stdout=io.StringIO())
+            with open(output) as f:
+                report = json.load(f)
+
+        self.assertEqual(set(report['views']), {'login', 'deposit', 'sendMoney', 'checkBalance', 'transactionHistory'})
+        self.assertEqual(report['views']['login']['count'], 2)
+        for name in ('deposit', 'sendMoney', 'checkBalance', 'transactionHistory'):
+            self.assertEqual(report['views'][name]['count'], 4)
+        for name in ('login', 'deposit', 'checkBalance', 'transactionHistory'):
+            self.assertEqual(report['views'][name]['errors'], 0, name)
+            self.assertGreater(report['views'][name]['queries_max'], 0)
+
+
+class ConcurrentBalanceStressTests(TransactionTestCase):
+    THREADS = 8
+    OPERATIONS_PER_THREAD = 250
+    START_BALANCE = Decimal('50.00')
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("Concurrent writers need a file-backed or server test database.")
+
+    def test_concurrent_deposits_and_transfers_keep_exact_balances(self):
+        account_ids = []
+        for i in range(2):
+            _, savings, chequing = make_customer(f"Stress {i}", f"stress{i}@example.com", self.START_BALANCE)
+            account_ids += [savings.id, chequing.id]
+
+        expected = {account_id: self.START_BALANCE for account_id in account_ids}
+        expected_lock = threading.Lock()
+        errors = []
+
+        def worker(seed):
+            rng = random.Random(seed)
+            try:
+                for _ in range(self.OPERATIONS_PER_THREAD):
+                    if rng.random() < 0.5:
+                        account_id = rng.choice(account_ids)
+                        services.deposit(account_id, Decimal('1.00'))
+                        with expected_lock:
+                            expected[account_id] += Decimal('1.00')
+                    else:
+                        sender, receiver = rng.sample(account_ids, 2)
+                        amount = Decimal(rng.randint(1, 30))
+                        try:
+                            services.transfer(sender, receiver, amount)
+                        except services.InsufficientFunds:
+                            continue
+                        with expected_lock:
+                            expected[sender] -= amount
+                            expected[receiver] += amount
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        balances = dict(Account.objects.values_list('id', 'balance'))
+        self.assertEqual(balances, expected)
+        for account_id in account_ids:
+            history = sum(Transaction.objects.filter(account_id=account_id).values_list('amount', flat=True), Decimal('0.00'))
+            self.assertEqual(self.START_BALANCE + history, balances[account_id])
+            ledger = sum(LedgerEntry.objects.filter(account_id=account_id).values_list('amount', flat=True), Decimal('0.00'))
+            self.assertEqual(self.START_BALANCE + ledger, balances[account_id])
+        self.assertEqual(services.unbalanced_journals(), [])
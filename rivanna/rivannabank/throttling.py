@@ -0,0 +1,113 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+
+class LocalBucketBackend:
+    """Token buckets held in this process's memory; the default backend."""
+
+    MAX_BUCKETS = 100000
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, per_seconds):
+        now = time.monotonic()
+        rate = capacity / per_seconds
+        with self._lock:
+            tokens, updated, _, _ = self._buckets.get(key, (capacity, now, capacity, rate))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            # Each bucket keeps its own limits so pruning can refill it correctly
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now, capacity, rate)
+            if len(self._buckets) > self.MAX_BUCKETS:
+                self._prune(now)
+            return allowed
+
+    def _prune(self, now):
+        # Buckets that have refilled completely carry no state worth keeping
+        for key, (tokens, updated, capacity, rate) in list(self._buckets.items()):
+            if tokens + (now - updated) * rate >= capacity:
+                del self._buckets[key]
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketBackend:
+    """Token buckets kept in a Django cache so every worker shares the limits.
+
+    The read and the write are separate cache calls, so a burst racing
+    across workers can get a few extra attempts through. That is an
+    acceptable trade against a lock round trip per login.
+    """
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def take(self, key, capacity, per_seconds):
+        now = time.time()
+        rate = capacity / per_seconds
+        tokens, updated = self.cache.get(f"login-throttle:{key}", (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        allowed = tokens >= 1
+        self.cache.set(f"login-throttle:{key}", (tokens - 1 if allowed else tokens, now), timeout=per_seconds)
+        return allowed
+
+    def reset(self):
+        pass
+
+
+class LoginThrottle:
+    """Token-bucket limits on login attempts per client IP and per username.
+
+    Checked before the password hash is even looked up, so a
+    credential-stuffing burst is turned away without any PBKDF2 work.
+    """
+
+    def __init__(self):
+        self._backend = None
+        self._lock = threading.Lock()
+        self.accepted = self.rejected_ip = self.rejected_username = 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = import_string(settings.LOGIN_THROTTLE_BACKEND)()
+        return self._backend
+
+    def allow(self, username, ip):
+        if not self.backend.take(f"ip:{ip}", *settings.LOGIN_THROTTLE_IP_RATE):
+            self._count('rejected_ip')
+            return False
+        if not self.backend.take(f"user:{username.lower()}", *settings.LOGIN_THROTTLE_USERNAME_RATE):
+            self._count('rejected_username')
+            return False
+        self._count('accepted')
+        return True
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'accepted': self.accepted,
+                'rejected_ip': self.rejected_ip,
+                'rejected_username': self.rejected_username,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.accepted = self.rejected_ip = self.rejected_username = 0
+        self.backend.reset()
+        self._backend = None
+
+
+login_throttle = LoginThrottle()
@@ -6,8 +6,15 @@ urlpatterns=[
     path("Create-Account",views.createAccount,name="create_account"),
     path("Login",views.login,name="login"),
     path("SendMoney",views.sendMoney,name="sendMoney"),
+    path("SendMoney/batch",views.sendMoneyBatch,name="sendMoneyBatch"),
+    path("SendMoney/status/<int:transfer_id>",views.transferStatus,name="transferStatus"),
     path("Transaction-History",views.transactionHistory,name="transactionHistory"),
+    path("Transaction-History/more",views.transactionHistoryMore,name="transactionHistoryMore"),
+    path("Transaction-History/export",views.exportStatement,name="exportStatement"),
+    path("Transaction-History/live",views.liveFeed,name="liveFeed"),
     path("Check-Balance",views.checkBalance,name="checkBalance"),
+    path("Check-Balance/summary",views.balanceSummary,name="balanceSummary"),
+    path("Analytics",views.analytics,name="analytics"),
     path("Deposit",views.deposit,name="deposit"),
     path('login/', views.login, name='custom_login'),
     path('logout/', views.logout, name='custom_logout'),
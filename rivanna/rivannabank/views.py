@@ -1,15 +1,33 @@
 from django.shortcuts import render, redirect
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
 from django.utils import timezone
-from django.db import connection, transaction
-from django.contrib.auth.decorators import login_required
-from django.contrib.auth.hashers import make_password, check_password
-from datetime import datetime
-from decimal import Decimal
+from django.db import connection, IntegrityError
+from django.db.models import OuterRef, Q, Subquery, Sum
+from django.db.models.functions import TruncMonth
+from django.contrib.auth.hashers import check_password
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import get_conditional_response, patch_cache_control
+from datetime import date, datetime, timedelta
+from itertools import islice
+from decimal import Decimal, InvalidOperation
+import asyncio
+import base64
+import hashlib
+import heapq
+import csv
+import json
 import logging
+import time
 
-from .models import Login, Customer, Account, Transaction, FundTransfer
+from .models import Customer, Account, Transaction, ArchivedTransaction, FundTransfer, DailyRollup, LedgerEntry
+from . import services
+from .events import event_bus
+from .idempotency import idempotent, new_key as new_idempotency_key
+from .instrumentation import query_budget
+from .statements import STATEMENT_FIELDS, STATEMENT_HEADER
+from .throttling import login_throttle
 
 logger = logging.getLogger(__name__)
 
@@ -17,15 +35,10 @@ def hash_password(password):
     import hashlib
     return hashlib.sha256(password.encode()).hexdigest()
 
+@query_budget(3)
 def home(request):
-    username = None
-    if is_logged_in(request):
-        try:
-            customer_id = request.session.get('customer_id')
-            customer = Customer.objects.get(id=customer_id)
-            username = customer.full_name.split(" ")[0]  # just first name, if you want
-        except Customer.DoesNotExist:
-            pass  # fallback: no name shown
+    # First name comes from the cached customer context; no name if the customer is gone
+    username = request.customer['first_name'] if request.customer else None
 
     return render(request, "home.html", {
         'logged_in': is_logged_in(request),
@@ -36,6 +49,29 @@ def home(request):
 def is_logged_in(request):
     return request.session.get('customer_id') is not None
 
+
+def customer_account_id(request, account_type):
+    # Account types are matched case-insensitively, as MySQL's collation does
+    if not request.customer or not account_type:
+        return None
+    return request.customer['account_ids'].get(account_type.lower())
+
+
+def has_step_up(request):
+    # True while a recent password re-entry still covers sensitive actions
+    return (
+        settings.STEP_UP_AUTH_TTL > 0
+        and request.session.get('step_up_customer_id') == request.session.get('customer_id')
+        and request.session.get('step_up_until', 0) > time.time()
+    )
+
+
+def grant_step_up(request):
+    if settings.STEP_UP_AUTH_TTL > 0:
+        request.session['step_up_customer_id'] = request.session.get('customer_id')
+        request.session['step_up_until'] = time.time() + settings.STEP_UP_AUTH_TTL
+
+@query_budget(6)
 def createAccount(request):
     if request.method == 'POST':
         fullname = request.POST['fullname']
@@ -49,48 +85,36 @@ def createAccount(request):
         if password != confirm_password:
             errors['confirm_password'] = "Passwords do not match."
 
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT 1 FROM rivannabank_customer WHERE email = %s", [email])
-            if cursor.fetchone():
-                errors['email'] = "Email is already registered."
-
-            cursor.execute("SELECT 1 FROM rivannabank_login WHERE username = %s", [username])
-            if cursor.fetchone():
-                errors['username'] = "Username is already taken."
-            if errors:
-                return render(request, 'create_account.html', {
-                    'errors': errors,
-                    'form_data': request.POST
-                })
-            with connection.cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO rivannabank_customer (full_name, phone, email, address, date_created)
-                    VALUES (%s, %s, %s, %s, NOW())
-                """, [fullname, phone, email, address])
-                customer_id = cursor.lastrowid
-
-                password_hash = make_password(password)
-
-                cursor.execute("""
-                    INSERT INTO rivannabank_login (username, password_hash, customer_id)
-                    VALUES (%s, %s, %s)
-                """, [username, password_hash, customer_id])
-
-                cursor.execute("""
-                    INSERT INTO rivannabank_account (account_type, balance, date_opened, customer_id)
-                    VALUES (%s, %s, NOW(), %s), (%s, %s, NOW(), %s)
-                """, ['Savings', 0.00, customer_id, 'Chequing', 0.00, customer_id])
+        errors.update(services.onboarding_conflicts(email, phone, username))
+        if not errors:
+            try:
+                services.onboard_customer(fullname, phone, email, address, username, password)
+            except IntegrityError:
+                # Lost a race with a concurrent sign-up using the same details
+                errors = services.onboarding_conflicts(email, phone, username)
+                if not errors:
+                    raise
+        if errors:
+            return render(request, 'create_account.html', {
+                'errors': errors,
+                'form_data': request.POST
+            })
 
         messages.success(request, "Account created successfully!")
         return render(request, 'message.html')
 
     return render(request, 'create_account.html')
 
+@query_budget(6)
 def login(request):
     if request.method == 'POST':
         username = request.POST['username'].strip()
         password = request.POST['password'].strip()
 
+        if not login_throttle.allow(username, request.META.get('REMOTE_ADDR', '')):
+            messages.error(request, "Too many login attempts. Please wait a minute and try again.")
+            return render(request, 'message.html', status=429)
+
         with connection.cursor() as cursor:
             cursor.execute("""
                 SELECT id, password_hash, customer_id
@@ -128,6 +152,10 @@ def logout(request):
     messages.info(request, "You have been logged out.")
     return redirect('/Login')
 
+# Worst case measured at 15: idempotency claim/store (3), password check (1),
+# cold customer context (1), posting with its savepoint (7), session save (3)
+@query_budget(16)
+@idempotent('deposit')
 def deposit(request):
     if not is_logged_in(request):
         messages.error(request, "You must be logged in to access this page.")
@@ -136,7 +164,7 @@ def deposit(request):
     if request.method == 'POST':
         try:
             amount = Decimal(request.POST.get("amount"))
-        except ValueError:
+        except (InvalidOperation, TypeError):
             messages.error(request, "Invalid amount format.")
             return redirect('/Deposit')
 
@@ -146,78 +174,56 @@ def deposit(request):
         customer_id = request.session.get('customer_id')
         try:
             with connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT id, password_hash 
-                    FROM rivannabank_login 
-                    WHERE customer_id = %s
-                """, [customer_id])
-                login_row = cursor.fetchone()
-
-                if login_row is None:
-                    messages.error(request, "Login record not found.")
-                    return redirect('/Deposit')
-
-                login_id, password_hash = login_row
-
-                if not check_password(password, password_hash):
-                    messages.error(request, "Incorrect password.")
-                    return redirect('/Deposit')
-
-                cursor.execute("""
-                    SELECT id, balance 
-                    FROM rivannabank_account 
-                    WHERE customer_id = %s AND account_type = %s
-                """, [customer_id, account_type])
-                account_row = cursor.fetchone()
-
-                if not account_row:
-                    messages.error(request, f"No {account_type} account found.")
-                    return redirect('/Deposit')
+                if not has_step_up(request):
+                    cursor.execute("""
+                        SELECT id, password_hash 
+                        FROM rivannabank_login 
+                        WHERE customer_id = %s
+                    """, [customer_id])
+                    login_row = cursor.fetchone()
 
-                account_id, current_balance = account_row
-                new_balance = Decimal(current_balance) + amount
+                    if login_row is None:
+                        messages.error(request, "Login record not found.")
+                        return redirect('/Deposit')
 
-                logger.info(f"Current balance: {current_balance}")
-                logger.info(f"New balance: {new_balance}")
-                logger.info(f"Account ID: {account_id}")
-                logger.info(f"Amount: {amount}")
+                    login_id, password_hash = login_row
 
-                with transaction.atomic():
-                    cursor.execute("""
-                        UPDATE rivannabank_account 
-                        SET balance = %s 
-                        WHERE id = %s
-                    """, [new_balance, account_id])
+                    if not check_password(password, password_hash):
+                        messages.error(request, "Incorrect password.")
+                        return redirect('/Deposit')
+                    grant_step_up(request)
 
-                    cursor.execute("""
-                        INSERT INTO rivannabank_transaction 
-                        (transaction_type, amount, date, status, account_id, balance_after_transaction)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                    """, ['Deposit', amount, timezone.now(), 'Completed', account_id, new_balance])
+            account_id = customer_account_id(request, account_type)
+            if account_id is None:
+                messages.error(request, f"No {account_type} account found.")
+                return redirect('/Deposit')
 
+            tx = services.deposit(account_id, amount)
+            logger.info("Deposit posted", extra={'account_id': account_id, 'amount': amount, 'balance': tx.balance_after_transaction})
 
             messages.success(request, f"Deposit of ₹{amount} to your {account_type} account successful!")
             return render(request, 'message.html')
 
         except Exception as e:
-            import traceback
-            traceback.print_exc()
-            logger.error(f"Exception during deposit: {e}")
+            logger.exception("Deposit failed")
             messages.error(request, f"Error: {str(e)}")
             return redirect('/Deposit')
 
-    return render(request, 'deposit.html')
+    return render(request, 'deposit.html', {
+        'step_up_active': has_step_up(request),
+        'idempotency_key': new_idempotency_key(),
+    })
 
+# Worst case measured at 17: idempotency claim/store (3), cold customer
+# context (1), cold recipient lookup (1), transfer with its savepoints (12)
+@query_budget(18)
+@idempotent('sendMoney')
 def sendMoney(request):
     if not is_logged_in(request):
         messages.error(request, "You must be logged in to send money.")
         return render(request, 'message.html')
     if request.method == "POST":
         try:
-            # Retrieve sender (assuming they are linked to a Login which links to Customer)
-            customer_id = request.session.get('customer_id')
-            sender = Customer.objects.get(id=customer_id)
-
             # Parse form data
             amount = Decimal(request.POST.get("amount"))
             account_type = request.POST.get("account_type")
@@ -226,64 +232,191 @@ def sendMoney(request):
             # Sanity checks
             if amount <= Decimal('0.00'):
                 messages.error(request, "Transfer amount must be greater than zero.")
-                return render(request, 'message.html')
+                return render(request, 'message.html', status=400)
 
-            # Get sender account (e.g., chequing/savings)
-            try:
-                sender_account = Account.objects.get(customer=sender, account_type=account_type)
-            except Account.DoesNotExist:
+            # Get sender account (e.g., chequing/savings) from the cached customer context
+            sender_account_id = customer_account_id(request, account_type)
+            if sender_account_id is None:
                 messages.error(request, "Your selected account type does not exist.")
-                return render(request, 'message.html')
-            # Check sufficient funds
-            if sender_account.balance < amount:
-                messages.error(request, "Insufficient funds in your account.")
-                return render(request, 'message.html')
+                return render(request, 'message.html', status=400)
 
-            # Get recipient customer and chequing account
+            # Get recipient chequing account (cached per recipient email)
             try:
-                recipient_customer = Customer.objects.get(email=recipient_email)
-                recipient_account = Account.objects.get(customer=recipient_customer, account_type="chequing")
+                recipient_account_id = services.resolve_recipient_account(recipient_email)
             except Customer.DoesNotExist:
                 messages.error(request, "Recipient email not registered.")
-                return render(request, 'message.html')
+                return render(request, 'message.html', status=404)
             except Account.DoesNotExist:
                 messages.error(request, "Recipient does not have a chequing account.")
-                return render(request, 'message.html')
-
-            # Transfer funds atomically
-            with transaction.atomic():
-                transfer = FundTransfer(
-                    amount=amount,
-                    sender_account=sender_account,
-                    receiver_account=recipient_account
-                )
-                transfer.save()  # This will update balances inside the model
+                return render(request, 'message.html', status=404)
+
+            # Queued mode: a run_transfer_workers process settles it, the client polls
+            if settings.ASYNC_TRANSFERS:
+                # Early, unlocked check; the worker re-checks under lock
+                if not Account.objects.filter(id=sender_account_id, balance__gte=amount).exists():
+                    messages.error(request, "Insufficient funds in your account.")
+                    return render(request, 'message.html', status=409)
+                transfer = services.enqueue_transfer(sender_account_id, recipient_account_id, amount)
+                messages.info(request, f"⏳ ${amount:.2f} to {recipient_email} is queued (reference #{transfer.id}).")
+                return render(request, 'message.html', {'transfer_status_url': f"/SendMoney/status/{transfer.id}"}, status=202)
+
+            # FundTransfer.save moves the money atomically; the balance is checked under the account lock
+            transfer = FundTransfer(
+                amount=amount,
+                sender_account_id=sender_account_id,
+                receiver_account_id=recipient_account_id
+            )
+            transfer.save()
             messages.success(request, f"💸 ${amount:.2f} sent to {recipient_email} successfully.")
             return render(request, 'message.html')
 
+        # Failures answer non-2xx so @idempotent frees the key and a retry runs for real
+        except (InvalidOperation, TypeError):
+            messages.error(request, "Invalid amount format.")
+            return render(request, 'message.html', status=400)
+        except services.InsufficientFunds:
+            messages.error(request, "Insufficient funds in your account.")
+            return render(request, 'message.html', status=409)
         except Exception as e:
+            # Deadlocks and lock timeouts land here; they are worth retrying
+            logger.exception("Transfer failed")
             messages.error(request, f"Something went wrong: {str(e)}")
-            return render(request, 'message.html')
+            return render(request, 'message.html', status=503)
+
+    return render(request, "sendMoney.html", {'idempotency_key': new_idempotency_key()})
+
+
+@query_budget(3)
+def transferStatus(request, transfer_id):
+    if not is_logged_in(request):
+        return JsonResponse({'error': 'Not logged in'}, status=403)
+    row = (
+        FundTransfer.objects.filter(id=transfer_id, sender_account__customer_id=request.session.get('customer_id'))
+        .values('id', 'status', 'status_detail', 'amount', 'date')
+        .first()
+    )
+    if row is None:
+        return JsonResponse({'error': 'Transfer not found.'}, status=404)
+    # 'Initiated' means the transfer is still waiting for a worker
+    row['pending'] = row['status'] == 'Initiated'
+    return JsonResponse(row, encoder=DjangoJSONEncoder)
+
+
+@query_budget(14)
+def sendMoneyBatch(request):
+    if not is_logged_in(request):
+        return JsonResponse({'error': 'Not logged in'}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST a JSON body or a CSV file of transfers.'}, status=405)
+
+    try:
+        if request.content_type == 'application/json':
+            body = json.loads(request.body)
+            account_type = body.get('account_type')
+            rows = services.transfer_rows(body.get('transfers', []))
+        else:
+            account_type = request.POST.get('account_type')
+            upload = request.FILES.get('file')
+            if upload is None:
+                return JsonResponse({'error': 'No transfer file uploaded.'}, status=400)
+            rows = services.read_transfer_rows(upload.read().decode('utf-8-sig'), 'csv')
+    except (ValueError, AttributeError) as e:
+        return JsonResponse({'error': f"Could not read transfers: {e}"}, status=400)
+
+    sender_account_id = customer_account_id(request, account_type)
+    if sender_account_id is None:
+        return JsonResponse({'error': 'Your selected account type does not exist.'}, status=404)
+
+    results = services.batch_transfer(sender_account_id, rows)
+    completed = sum(1 for result in results if result['status'] == 'Completed')
+    return JsonResponse({
+        'completed': completed,
+        'failed': len(results) - completed,
+        'results': results,
+    })
+
+
+HISTORY_PAGE_SIZE = 25
+
 
-    return render(request, "sendMoney.html")
+def encode_history_cursor(tx):
+    # Opaque keyset cursor pointing just past the given transaction
+    raw = f"{tx.date.isoformat()}|{tx.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
 
 
+def decode_history_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    cursor_date, tx_id = raw.split("|")
+    return datetime.fromisoformat(cursor_date), int(tx_id)
+
+
+def customer_transactions(model, customer_id):
+    # model is Transaction (hot) or ArchivedTransaction (cold)
+    account_ids = Account.objects.filter(customer_id=customer_id).values('id')
+    return model.objects.filter(account_id__in=account_ids)
+
+
+def account_history(model, account_id, after=None, limit=HISTORY_PAGE_SIZE):
+    """One account's rows newest first, starting just past the (date, id) `after`.
+
+    Reads straight down the (account, -date, -id) index: date <= cursor seeks
+    to the position and the OR only filters rows tied on that date, so no
+    sort and no scan of the rows already shown.
+    """
+    transactions = model.objects.filter(account_id=account_id)
+    if after:
+        cursor_date, tx_id = after
+        transactions = transactions.filter(date__lte=cursor_date).filter(Q(date__lt=cursor_date) | Q(id__lt=tx_id))
+    return transactions.order_by('-date', '-id')[:limit]
+
+
+def history_page(account_ids, cursor=None, limit=HISTORY_PAGE_SIZE):
+    """Return one page of the given accounts' transactions, newest first.
+
+    Pages are keyed on (date, id) rather than OFFSET. Each account is read
+    with its own LIMIT query on the (account, -date, -id) index and the
+    already-sorted results are merged here, so a page costs one index range
+    read per account and table however long the history is.
+    """
+    after = decode_history_cursor(cursor) if cursor else None
+    rows = []
+    # Archived rows are all older than hot ones, so read the hot table first
+    # and only fall through to the archive once it is exhausted.
+    for model in (Transaction, ArchivedTransaction):
+        wanted = limit + 1 - len(rows)
+        streams = [list(account_history(model, account_id, after, wanted)) for account_id in account_ids]
+        rows += islice(heapq.merge(*streams, key=lambda tx: (tx.date, tx.id), reverse=True), wanted)
+        if len(rows) > limit:
+            break
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_history_cursor(rows[-1])
+    return rows, next_cursor
+
+
+def customer_account_ids(request):
+    # From the cached customer context, so listing accounts costs no query
+    return sorted(request.customer['account_ids'].values()) if request.customer else []
+
+
+# Session (1), cold customer context (1), then per account (two per customer)
+# one hot-table page and, once the hot rows run out, one archive page
+@query_budget(6)
 def transactionHistory(request):
     if not is_logged_in(request):
         messages.error(request, "You must be logged in to access this page.")
         return render(request, 'message.html')
-    customer_id = request.session.get('customer_id')
 
     try:
-        # Get all accounts of the logged-in customer
-        accounts = Account.objects.filter(customer_id=customer_id)
-        account_ids = accounts.values_list('id', flat=True)
-
-        # Get all transactions related to these accounts, in descending order
-        transactions = Transaction.objects.filter(account_id__in=account_ids).order_by('-date')
+        # Only the first page is rendered; the rest is fetched via "load more"
+        transactions, next_cursor = history_page(customer_account_ids(request))
 
         return render(request, 'transactionHistory.html', {
-            'transactions': transactions
+            'transactions': transactions,
+            'next_cursor': next_cursor,
         })
 
     except Exception as e:
@@ -291,6 +424,274 @@ def transactionHistory(request):
         return render(request, 'message.html')
 
 
+# Session (1), cold customer context (1), then per account (two per customer)
+# one hot-table page and, once the hot rows run out, one archive page
+@query_budget(6)
+def transactionHistoryMore(request):
+    if not is_logged_in(request):
+        return JsonResponse({'error': 'Not logged in'}, status=403)
+
+    try:
+        transactions, next_cursor = history_page(customer_account_ids(request), request.GET.get('cursor'))
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({'error': 'Invalid cursor.'}, status=400)
+
+    return JsonResponse({
+        'transactions': [
+            {
+                'id': tx.id,
+                'date': timezone.localtime(tx.date).strftime("%Y-%m-%d %H:%M"),
+                'transaction_type': tx.transaction_type,
+                'amount': f"{tx.amount:.2f}",
+                'status': tx.status,
+                'balance_after_transaction': (
+                    f"{tx.balance_after_transaction:.2f}"
+                    if tx.balance_after_transaction is not None else None
+                ),
+            }
+            for tx in transactions
+        ],
+        'next_cursor': next_cursor,
+    })
+
+
+def live_event_data(event):
+    """Format a feed event the way transactionHistoryMore formats rows."""
+    if event['type'] == 'transaction':
+        event = {
+            **event,
+            'date': timezone.localtime(event['date']).strftime("%Y-%m-%d %H:%M"),
+            'amount': f"{event['amount']:.2f}",
+            'balance_after_transaction': (
+                f"{event['balance_after_transaction']:.2f}"
+                if event['balance_after_transaction'] is not None else None
+            ),
+        }
+    elif event['type'] == 'balance':
+        event = {**event, 'balance': f"{event['balance']:.2f}"}
+    return json.dumps(event, cls=DjangoJSONEncoder)
+
+
+async def live_events(account_ids):
+    # Subscribed on first iteration, so a response that is never streamed leaves nothing behind
+    subscription = event_bus.subscribe(account_ids)
+    try:
+        # Reconnect after 5s if the connection drops
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), settings.LIVE_FEED_HEARTBEAT)
+            except asyncio.TimeoutError:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {event['type']}\ndata: {live_event_data(event)}\n\n"
+    finally:
+        event_bus.unsubscribe(subscription)
+
+
+@query_budget(2)
+async def liveFeed(request):
+    # Async all the way down, so under ASGI an idle client holds no thread
+    customer_id = await request.session.aget('customer_id')
+    if not customer_id:
+        return JsonResponse({'error': 'Not logged in'}, status=403)
+    account_ids = [account_id async for account_id in Account.objects.filter(customer_id=customer_id).values_list('id', flat=True)]
+
+    response = StreamingHttpResponse(live_events(account_ids), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+STATEMENT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    # Pseudo-buffer for csv.writer: hand each formatted line straight back
+    def write(self, value):
+        return value
+
+
+def parse_statement_range(request):
+    start = request.GET.get('start')
+    end = request.GET.get('end')
+    start = date.fromisoformat(start) if start else None
+    end = date.fromisoformat(end) if end else None
+    if start and end and start > end:
+        raise ValueError("start must not be after end")
+    return start, end
+
+
+def statement_rows(customer_id, start=None, end=None, chunk_size=STATEMENT_CHUNK_SIZE):
+    """Yield a customer's transactions oldest first as tuples of STATEMENT_FIELDS.
+
+    Archived rows come first, then the hot table. Rows are read in keyset
+    batches on (date, id), so memory stays flat on every backend, including
+    MySQL drivers that buffer whole result sets.
+    """
+    for model in (ArchivedTransaction, Transaction):
+        transactions = customer_transactions(model, customer_id)
+        if start:
+            transactions = transactions.filter(date__gte=timezone.make_aware(datetime.combine(start, datetime.min.time())))
+        if end:
+            transactions = transactions.filter(date__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), datetime.min.time())))
+        transactions = transactions.order_by('date', 'id').values_list(*STATEMENT_FIELDS)
+
+        after = None
+        while True:
+            batch = transactions
+            if after:
+                batch = batch.filter(Q(date__gt=after[1]) | Q(date=after[1], id__gt=after[0]))
+            rows = list(batch[:chunk_size])
+            yield from rows
+            if len(rows) < chunk_size:
+                break
+            after = rows[-1]
+
+
+def statement_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(STATEMENT_HEADER)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def statement_ndjson(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(STATEMENT_HEADER, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+# No @query_budget: the rows are read while the body streams, after the view
+# returns, at one keyset query per chunk, so a per-request cap would measure nothing
+def exportStatement(request):
+    if not is_logged_in(request):
+        messages.error(request, "You must be logged in to access this page.")
+        return render(request, 'message.html')
+    customer_id = request.session.get('customer_id')
+
+    try:
+        start, end = parse_statement_range(request)
+    except ValueError as e:
+        return JsonResponse({'error': f"Invalid date range: {e}"}, status=400)
+
+    output = request.GET.get('format', 'csv')
+    rows = statement_rows(customer_id, start, end)
+    if output == 'csv':
+        response = StreamingHttpResponse(statement_csv(rows), content_type='text/csv')
+    elif output == 'ndjson':
+        response = StreamingHttpResponse(statement_ndjson(rows), content_type='application/x-ndjson')
+    else:
+        return JsonResponse({'error': 'format must be csv or ndjson.'}, status=400)
+
+    filename = f"statement-{start or 'all'}-{end or 'latest'}.{output}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+ANALYTICS_MAX_MONTHS = 120
+
+
+@query_budget(2)
+def analytics(request):
+    if not is_logged_in(request):
+        return JsonResponse({'error': 'Not logged in'}, status=403)
+    try:
+        months = min(max(int(request.GET.get('months', 12)), 1), ANALYTICS_MAX_MONTHS)
+    except ValueError:
+        return JsonResponse({'error': 'months must be a number.'}, status=400)
+    account_type = request.GET.get('account_type')
+
+    # First day of the month `months - 1` months before the current one
+    first = timezone.localdate().replace(day=1)
+    index = first.year * 12 + first.month - months
+    since = date(index // 12, index % 12 + 1, 1)
+
+    # Reads only the precomputed daily rollups, never the transaction tables
+    rollups = DailyRollup.objects.filter(account__customer_id=request.session.get('customer_id'), day__gte=since)
+    if account_type:
+        rollups = rollups.filter(account__account_type=account_type)
+    rows = (
+        rollups.annotate(month=TruncMonth('day'))
+        .values('month', 'transaction_type')
+        .annotate(income=Sum('credits'), spending=Sum('debits'), transaction_count=Sum('transaction_count'))
+        .order_by('month', 'transaction_type')
+    )
+
+    summary = {}
+    for row in rows:
+        month = summary.setdefault(row['month'].strftime('%Y-%m'), {'income': Decimal('0.00'), 'spending': Decimal('0.00'), 'by_type': {}})
+        month['income'] += row['income']
+        month['spending'] += row['spending']
+        month['by_type'][row['transaction_type']] = {
+            'income': f"{row['income']:.2f}", 'spending': f"{row['spending']:.2f}", 'transaction_count': row['transaction_count'],
+        }
+    return JsonResponse({
+        'since': since.isoformat(),
+        'months': [
+            {'month': month, 'income': f"{totals['income']:.2f}", 'spending': f"{totals['spending']:.2f}", 'by_type': totals['by_type']}
+            for month, totals in summary.items()
+        ],
+    })
+
+
+def balance_summary(customer_id):
+    """Every account's balance and latest transaction id, in a single query."""
+    latest = Transaction.objects.filter(account=OuterRef('pk')).order_by('-date', '-id').values('id')[:1]
+    accounts = list(
+        Account.objects.filter(customer_id=customer_id)
+        .order_by('id')
+        .values('id', 'account_type', 'balance')
+        .annotate(latest_transaction_id=Subquery(latest))
+    )
+    transaction_ids = [account['latest_transaction_id'] for account in accounts if account['latest_transaction_id']]
+    return {'accounts': accounts, 'latest_transaction_id': max(transaction_ids, default=None)}
+
+
+def balance_version(customer_id):
+    """A cheap validator for balance_summary, in one query.
+
+    Per account: the balance, the newest ledger entry id and the newest
+    hot-table transaction id, each an index-only lookup. Every posting adds
+    a ledger entry, a rebuilt balance changes the balance column, and
+    archiving an account's latest transaction empties (or lowers) its hot
+    max id, so nothing the summary reports can change without this changing.
+    A match costs this query alone; a miss runs balance_summary as well.
+    """
+    newest_entry = LedgerEntry.objects.filter(account=OuterRef('pk')).order_by('-id').values('id')[:1]
+    newest_transaction = Transaction.objects.filter(account=OuterRef('pk')).order_by('-id').values('id')[:1]
+    return list(
+        Account.objects.filter(customer_id=customer_id)
+        .order_by('id')
+        .annotate(last_entry_id=Subquery(newest_entry), last_transaction_id=Subquery(newest_transaction))
+        .values_list('id', 'balance', 'last_entry_id', 'last_transaction_id')
+    )
+
+
+@query_budget(2)
+def balanceSummary(request):
+    if not is_logged_in(request):
+        return JsonResponse({'error': 'Not logged in'}, status=403)
+    # Same password gate as Check-Balance, but only while step-up is fresh
+    if not has_step_up(request):
+        return JsonResponse({'error': 'Password confirmation required.'}, status=403)
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Use GET.'}, status=405)
+
+    customer_id = request.session.get('customer_id')
+    # A 304 costs only the version query; a miss runs the summary too, two queries in all
+    version = json.dumps(balance_version(customer_id), cls=DjangoJSONEncoder)
+    etag = '"%s"' % hashlib.md5(version.encode()).hexdigest()
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        body = json.dumps(balance_summary(customer_id), cls=DjangoJSONEncoder)
+        response = HttpResponse(body, content_type='application/json')
+    response.headers['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@query_budget(6)
 def checkBalance(request):
     if not is_logged_in(request):
         if request.headers.get('x-requested-with') == 'XMLHttpRequest':
@@ -305,26 +706,28 @@ def checkBalance(request):
 
         try:
             with connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT password_hash 
-                    FROM rivannabank_login 
-                    WHERE customer_id = %s
-                """, [customer_id])
-                row = cursor.fetchone()
-
-                if row is None:
-                    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-                        return JsonResponse({'error': 'Login not found.'}, status=404)
-                    messages.error(request, "Login not found.")
-                    return redirect('/Check-Balance')
-
-                stored_password_hash = row[0]
-
-                if not check_password(password, stored_password_hash):
-                    error_msg = "Incorrect password."
-                    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-                        return JsonResponse({'error': error_msg}, status=403)
-                    return redirect('/Check-Balance', {'error': error_msg})
+                if not has_step_up(request):
+                    cursor.execute("""
+                        SELECT password_hash 
+                        FROM rivannabank_login 
+                        WHERE customer_id = %s
+                    """, [customer_id])
+                    row = cursor.fetchone()
+
+                    if row is None:
+                        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                            return JsonResponse({'error': 'Login not found.'}, status=404)
+                        messages.error(request, "Login not found.")
+                        return redirect('/Check-Balance')
+
+                    stored_password_hash = row[0]
+
+                    if not check_password(password, stored_password_hash):
+                        error_msg = "Incorrect password."
+                        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                            return JsonResponse({'error': error_msg}, status=403)
+                        return redirect('/Check-Balance', {'error': error_msg})
+                    grant_step_up(request)
 
                 cursor.execute("""
                     SELECT balance 
@@ -342,10 +745,10 @@ def checkBalance(request):
                     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
                         return JsonResponse({'error': f"{account_type.capitalize()} account not found."}, status=404)
                     messages.error(request, f"{account_type.capitalize()} account not found.")
-        except Exception as e:
-            logger.error(f"Exception in checkBalance: {e}")
+        except Exception:
+            logger.exception("Balance check failed")
             if request.headers.get('x-requested-with') == 'XMLHttpRequest':
                 return JsonResponse({'error': 'Internal server error.'}, status=500)
             messages.error(request, "Something went wrong while fetching your balance.")
 
-    return render(request, 'checkBalance.html')
\ No newline at end of file
+    return render(request, 'checkBalance.html', {'step_up_active': has_step_up(request)})
\ No newline at end of file